@@ -16,7 +16,8 @@ for name in os.listdir(INPUT_DIR):
     print(f"PATH: {input_path}")
     image = cv2.imread(input_path)
 
-    numbers, imgs = recognize_digits(image, with_visualization=True)
+    numbers, imgs, metadata = recognize_digits(image, with_visualization=True)
+    print(f"STAGES: {metadata['stage_durations']}")
     for number in numbers:
         print(number)
 
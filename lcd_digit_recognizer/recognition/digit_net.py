@@ -1,6 +1,7 @@
 from operator import itemgetter
 
 from lcd_digit_recognizer.recognition.primitives.digit_center import DigitCenter
+from lcd_digit_recognizer.recognition.primitives.point_grid import PointGrid
 import numpy as np
 
 from lcd_digit_recognizer.recognition.utils import angle_between, linear_clustering, ratio_error, span_clustering, \
@@ -19,7 +20,7 @@ class DigitNet(object):
         self._digit_centers.append(DigitCenter(x, y, owner))
 
     def get_aligned_center_buckets(self):
-        self._ensure_merged_centers()
+        self.merge_centers()
 
         measured_centers = []
         for center in self.centers:
@@ -81,10 +82,14 @@ class DigitNet(object):
 
     @property
     def centers(self):
-        self._ensure_merged_centers()
+        self.merge_centers()
         return self._digit_centers
 
-    def _ensure_merged_centers(self):
+    def merge_centers(self):
+        """
+        Collapses close centers and connects their neighbours and cocenters, no hypotheses can be added afterwards.
+        It is done by the first read of the centers when not called explicitly.
+        """
         if self._are_centers_merged:
             return  # nothing to do
 
@@ -95,28 +100,46 @@ class DigitNet(object):
         self._fill_cocenters()
         # self._prune_alone_cocenters()
 
+    def _create_center_grid(self) -> PointGrid:
+        """
+        :return: grid of the digit centers keyed by their index, cells are as large as a typical segment
+        """
+        segment_lengths = [center.average_segment_length for center in self._digit_centers]
+        cell_size = float(np.median(segment_lengths)) if segment_lengths else 1.0
+        grid = PointGrid(max(cell_size, 1.0))
+        for i, center in enumerate(self._digit_centers):
+            grid.add(i, center._x, center._y)
+
+        return grid
+
     def _fill_cocenters(self):
-        center_pool = list(self._digit_centers)
+        center_indexes = {center: i for i, center in enumerate(self._digit_centers)}
 
-        while center_pool:
-            current_center = center_pool.pop(0)
-            for center in center_pool:
-                if center not in current_center.neighbours:
+        for i, current_center in enumerate(self._digit_centers):
+            # neighbours are visited in the center order, as cocenters are appended to both centers
+            neighbour_indexes = sorted(center_indexes[center] for center in current_center.neighbours)
+            for j in neighbour_indexes:
+                if j <= i:
                     continue
 
+                center = self._digit_centers[j]
                 average_segment_length = (current_center.average_segment_length + center.average_segment_length) / 2
                 distance_length_diff = abs(current_center.distance_to(center) - average_segment_length)
                 if distance_length_diff / average_segment_length < 0.8:
                     current_center.add_cocenter(center)
 
     def _fill_neighbours(self):
-        center_pool = list(self._digit_centers)
+        grid = self._create_center_grid()
+
+        for i, current_center in enumerate(self._digit_centers):
+            max_distance = current_center.average_segment_length * 2.5
+            for j in grid.query(current_center._x, current_center._y, max_distance):
+                if j <= i:
+                    continue
 
-        while center_pool:
-            current_center = center_pool.pop(0)
-            for center in center_pool:
+                center = self._digit_centers[j]
                 distance = current_center.distance_to(center)
-                if distance > current_center.average_segment_length * 2.5:
+                if distance > max_distance:
                     continue
 
                 if distance < current_center.average_segment_length * 0.7:
@@ -135,21 +158,45 @@ class DigitNet(object):
                 current_center.try_add_neighbour(center)
 
     def _collapse_close_centers(self):
-        center_pool = list(self._digit_centers)
-        while center_pool:
-            current_center = center_pool.pop(0)
-            best_center = None
-            best_distance = None
-            for center in center_pool:
-                # if not current_center.can_merge_with(center):
-                #    continue
+        if not self._digit_centers:
+            return
 
-                distance = current_center.distance_to(center)
+        grid = self._create_center_grid()
 
+        # merges happen only closer than half of the segment length,
+        # so the nearest center needs to be searched only up to max_distance
+        max_distance = max(center.average_segment_length for center in self._digit_centers) / 2
+        is_collapsed = [False] * len(self._digit_centers)
+
+        for i, current_center in enumerate(self._digit_centers):
+            grid.remove(i)  # only the following centers are merge candidates
+
+            best_index, best_distance = self._find_nearest_center(grid, current_center, max_distance)
+            if best_distance and best_distance < self._digit_centers[best_index].average_segment_length / 2:
+                best_center = self._digit_centers[best_index]
+                best_center.merge_with(current_center)
+                grid.move(best_index, best_center._x, best_center._y)
+                is_collapsed[i] = True
+
+        self._digit_centers = [center for center, collapsed in zip(self._digit_centers, is_collapsed) if not collapsed]
+
+    def _find_nearest_center(self, grid: PointGrid, center: DigitCenter, max_distance):
+        """
+        :return: (index, distance) of the nearest center in the grid (the first one on a tie) or (None, None),
+            centers farther than max_distance may be missed
+        """
+        radius = min(grid.cell_size, max_distance)
+        while True:
+            best_index = None
+            best_distance = None
+            for i in grid.query(center._x, center._y, radius):
+                distance = center.distance_to(self._digit_centers[i])
                 if best_distance is None or best_distance > distance:
                     best_distance = distance
-                    best_center = center
+                    best_index = i
 
-            if best_distance and best_distance < best_center.average_segment_length / 2:
-                best_center.merge_with(current_center)
-                self._digit_centers.remove(current_center)
+            # centers outside of the queried square are farther than the radius
+            if (best_distance is not None and best_distance <= radius) or radius >= max_distance:
+                return best_index, best_distance
+
+            radius = min(2 * radius, max_distance)
@@ -1,9 +1,12 @@
+from collections import deque
+
 import numpy as np
 from typing import List
 
 from lcd_digit_recognizer.recognition.primitives.digit_hypothesis import DigitHypothesis
 from lcd_digit_recognizer.recognition.primitives.joint import Joint
 from lcd_digit_recognizer.recognition.primitives.physical_line import PhysicalLine
+from lcd_digit_recognizer.recognition.primitives.point_grid import PointGrid
 from lcd_digit_recognizer.recognition.utils import angle_between, angle_between_points, ratio_error, \
     get_segment_aligned_angle
 
@@ -34,12 +37,8 @@ class DigitNet2(object):
         return result
 
     def _join_vote_components(self, lines: List[PhysicalLine]):
-        for i in range(len(lines)):
-            line1 = lines[i]
-
-            for j in range(i + 1, len(lines)):
-                line2 = lines[j]
-                self._try_join(line1, line2)
+        for i, j in self._get_join_candidates(lines):
+            self._try_join(lines[i], lines[j])
 
         for line in lines:
             current_joints = {}
@@ -67,9 +66,9 @@ class DigitNet2(object):
                 continue
 
             component = []
-            worklist = [line]
+            worklist = deque([line])
             while worklist:
-                current_line = worklist.pop(0)
+                current_line = worklist.popleft()
                 if current_line in covered_lines:
                     continue
 
@@ -83,6 +82,35 @@ class DigitNet2(object):
 
         return result
 
+    def _get_join_candidates(self, lines: List[PhysicalLine]):
+        """
+        :return: index pairs (i, j), i < j, in the order of all pairs, leaving out the pairs
+            whose endpoints are too far apart to be a single component
+        """
+        if not lines:
+            return []
+
+        metric_lengths = [line.metric_length for line in lines]
+
+        # each endpoint is keyed by 2 * line index (+1 for the end point)
+        grid = PointGrid(max(float(np.median(metric_lengths)) / 2.5, 1.0))
+        for i, line in enumerate(lines):
+            for k, (x, y) in enumerate(line.significant_points):
+                grid.add(2 * i + k, x, y)
+
+        candidates = set()
+        for i, line in enumerate(lines):
+            # endpoint distance of a single component is at most the average length / 2.5,
+            # so the longer line of the pair always finds the shorter one
+            max_distance = metric_lengths[i] / 2.5
+            for x, y in line.significant_points:
+                for key in grid.query(x, y, max_distance):
+                    j = key // 2
+                    if j != i:
+                        candidates.add((min(i, j), max(i, j)))
+
+        return sorted(candidates)
+
     def _is_single_component(self, line1: PhysicalLine, line2: PhysicalLine):
         c1 = line1.center
         c2 = line2.center
@@ -1,4 +1,3 @@
-import time
 from typing import List
 
 import cv2
@@ -15,6 +14,7 @@ from lcd_digit_recognizer.visualization.drawing import draw_recognized_digits, d
     draw_aligned_center_buckets, draw_aligned_center_buckets_simple, draw_physical_line_clusters, draw_join_points, \
     draw_digit_hypotheses
 from lcd_digit_recognizer.visualization.utils import rotate90, get_color
+from recognize_seven_segment.utils.stage_timer import StageTimer
 
 WORKING_IMAGE_SIZE = 500  # size of largest edge of the processed image (original is resized to this)
 MINIMAL_NUMBER_LENGTH = 2  # numbers with lesser digits will be thrown away
@@ -27,6 +27,8 @@ SHARP_EDGE_COLOR_FACTOR = 0.2  # factor used for color rescaling
 MIN_CENTER_ARM_LENGTH = 5  # how many pixels, between center and segment is required at minimum
 CENTER_ARM_LENGH_FACTOR = 1.1 / 2  # how long center arm length is based on center cocenter length
 
+STAGE_TIMER = StageTimer()  # aggregates the stage durations of all recognize_digits calls of the process
+
 """
 # s2 #
 s1 # s3
@@ -52,32 +54,31 @@ digit_table = {
 }
 
 
-def recognize_digits(input_img, with_visualization=False):
-    start = time.time()
+def recognize_digits(input_img, with_visualization=False, stage_timer=None):
+    """
+    :param stage_timer: records durations of the recognition stages (visualization is not timed),
+        STAGE_TIMER by default
+    :return: digit hypotheses, visualization images and metadata with the "stage_durations" of the call
+    """
+    if stage_timer is None:
+        stage_timer = STAGE_TIMER
+
+    stage_timer.start_call()
+
+    with stage_timer.stage("preprocessing"):
+        edged, img = preprocess_image(input_img)
 
-    edged, img = preprocess_image(input_img)
-    print(f"Image preprocessing {time.time() - start}")
     output_imgs = []
 
     if with_visualization:
         output_imgs.append(cv2.cvtColor(edged, cv2.COLOR_GRAY2BGR))
 
 
-    recognizer = PhysicalLineRecognizer(is_vertical=False)
-    for edge_line in edged:
-        recognizer.accept(edge_line)
-
-    recognizer2 = PhysicalLineRecognizer(is_vertical=True)
-    for edge_line2 in rotate90(edged):
-        recognizer2.accept(edge_line2)
+    with stage_timer.stage("line_recognition"):
+        all_lines = recognize_physical_lines(edged)
 
-    print(f"Line recognition {time.time() - start}")
-
-    all_lines = recognizer.get_physical_lines() + recognizer2.get_physical_lines()
-    print(f"Physical line collection {time.time() - start} ")
-    filtered_lines = digit_line_filter(all_lines)
-
-    print(f"Line filtering {time.time() - start}")
+    with stage_timer.stage("line_filtering"):
+        filtered_lines = digit_line_filter(all_lines)
 
     if with_visualization:
         net2 = DigitNet2(img, filtered_lines)
@@ -98,9 +99,9 @@ def recognize_digits(input_img, with_visualization=False):
         output_imgs.append(output_img)
         draw_lines(output_img, filtered_lines)
 
-    net = get_digit_net(filtered_lines)
-    # net.get_aligned_center_buckets()
-    # print(f"Digit net creation {time.time() - start}")
+    with stage_timer.stage("net_construction"):
+        net = get_digit_net(filtered_lines)
+        net.merge_centers()
 
     if with_visualization:
         output_img = np.array(img)
@@ -115,15 +116,31 @@ def recognize_digits(input_img, with_visualization=False):
         output_imgs.append(output_img)
         draw_aligned_center_buckets_simple(output_img, net)
 
-    digit_hyps = get_number_hypotheses(img, net)
-    print(f"Number hypothesis {time.time() - start}")
+    with stage_timer.stage("hypothesis_extraction"):
+        digit_hyps = get_number_hypotheses(img, net)
 
     if with_visualization:
         output_img = np.array(img)
         output_imgs.append(output_img)
         draw_recognized_digits(output_img, digit_hyps)
 
-    return digit_hyps, output_imgs
+    return digit_hyps, output_imgs, {"stage_durations": dict(stage_timer.durations)}
+
+
+def recognize_physical_lines(edged) -> List[PhysicalLine]:
+    """
+    Recognizes horizontal and vertical lines of the edge image.
+
+    :return: horizontal lines followed by the vertical ones
+    """
+    # the vertical pass scans a contiguous transposed copy instead of the swapped axes view
+    return _recognize_pass_lines(edged, False) + _recognize_pass_lines(np.ascontiguousarray(rotate90(edged)), True)
+
+
+def _recognize_pass_lines(image, is_vertical) -> List[PhysicalLine]:
+    recognizer = PhysicalLineRecognizer(is_vertical=is_vertical)
+    recognizer.accept_image(image)
+    return recognizer.get_physical_lines()
 
 
 def segment_clustering(lines: List[PhysicalLine]):
@@ -143,17 +160,21 @@ def preprocess_image(img):
 
 
 def get_number_hypotheses(original_img, net):
-    img = np.array(original_img)
-    img = np.sum(img, axis=2) * SHARP_EDGE_COLOR_FACTOR
+    color_sums = get_color_sums(original_img)
     result = []
-    for center_bucket in net.get_aligned_center_buckets():
-        current_number = None
 
-        filtered_bucket = filter_surrounding_artifacts(center_bucket)
+    center_buckets = net.get_aligned_center_buckets()
+    filtered_buckets = [filter_surrounding_artifacts(center_bucket) for center_bucket in center_buckets]
+
+    # states of all buckets are sampled at once
+    digit_states = iter(get_digit_states(color_sums, [b[0:2] for bucket in filtered_buckets for b in bucket]))
+
+    for center_bucket, filtered_bucket in zip(center_buckets, filtered_buckets):
+        current_number = None
 
         for b in filtered_bucket:
             center, cocenter = b[0:2]
-            digit_state = get_digit_state(img, center, cocenter)
+            digit_state = next(digit_states)
             digit_value = recognize_digit(digit_state)
             # print(f"{center}->{cocenter}")
             # print(digit_state)
@@ -239,6 +260,100 @@ def get_digit_state(img, center, cocenter):
     return [s1, s2, s3, s4, s5, s6, s7a]
 
 
+def get_color_sums(img):
+    """
+    :return: sums of the color channels (sharp edges are searched on these scaled by SHARP_EDGE_COLOR_FACTOR)
+    """
+    if img.dtype == np.uint8:
+        return np.sum(img, axis=2, dtype=np.uint16)  # enough for 3 channels
+
+    return np.sum(img, axis=2)
+
+
+def get_digit_states(color_sums, center_pairs):
+    """
+    Same as get_digit_state for every (center, cocenter) pair, the arms of all pairs are sampled at once.
+    """
+    starts = []
+    directions = []
+    lengths = []
+    for center, cocenter in center_pairs:
+        arm_length = int(center.distance_to(cocenter) * CENTER_ARM_LENGH_FACTOR)
+        for c1, c2 in [(center, cocenter), (cocenter, center)]:
+            starts.append((c1.x, c1.y))
+            directions.append((c2.x - c1.x, c2.y - c1.y))
+            lengths.append(arm_length)
+
+    if not starts:
+        return []
+
+    directions = np.array(directions)
+    with np.errstate(invalid="ignore"):
+        directions = directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]  # same as unit_vector
+
+    # arms in the get_directions order
+    arm_directions = [directions]
+    for _ in range(3):
+        arm_directions.append(np.stack([arm_directions[-1][:, 1], -arm_directions[-1][:, 0]], axis=1))
+
+    arm_states = get_arm_states(
+        color_sums,
+        np.repeat(np.array(starts), 4, axis=0),
+        np.stack(arm_directions, axis=1).reshape(-1, 2),
+        np.repeat(np.array(lengths), 4)
+    ).reshape(-1, 2, 4)
+
+    result = []
+    for state1, state2 in arm_states.tolist():
+        s7a, s1, s2, s3 = state1
+        s7b, s4, s5, s6 = state2
+
+        if s7a != s7b:
+            result.append(None)
+        else:
+            result.append([s1, s2, s3, s4, s5, s6, s7a])
+
+    return result
+
+
+def get_arm_states(color_sums, starts, directions, lengths):
+    """
+    Vectorized has_sharp_edge of many arms, samples of all arms are read by a single fancy index.
+
+    :param starts: array (n, 2) of the integer start points
+    :param directions: array (n, 2) of the unit directions
+    :param lengths: array (n,) of the integer arm lengths
+    :return: bool array (n,), True where the arm crosses an active segment
+    """
+    arm_count = len(lengths)
+    total_length = int(lengths.sum())
+    if total_length == 0:
+        return np.zeros(arm_count, dtype=bool)
+
+    arm_indexes = np.repeat(np.arange(arm_count), lengths)
+    steps = np.arange(total_length) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # int() of the sampled points truncates towards zero as astype does
+    xs = (starts[arm_indexes, 0] + directions[arm_indexes, 0] * steps).astype(np.int64)
+    ys = (starts[arm_indexes, 1] + directions[arm_indexes, 1] * steps).astype(np.int64)
+    is_inside = (xs >= 0) & (ys >= 0) & (xs < color_sums.shape[0]) & (ys < color_sums.shape[1])
+
+    colors = np.zeros(total_length)
+    colors[is_inside] = color_sums[xs[is_inside], ys[is_inside]].astype(np.float64) * SHARP_EDGE_COLOR_FACTOR
+
+    is_edge = np.zeros(total_length, dtype=bool)
+    is_edge[1:] = (np.abs(colors[1:] - colors[:-1]) > SHARP_EDGE_DIFF_THRESHOLD) & (steps[1:] > 0)
+
+    # the walk of an arm ends at its first sample outside of the image or at its first edge
+    event_indexes = np.flatnonzero(~is_inside | is_edge)
+    event_arms, first_events = np.unique(arm_indexes[event_indexes], return_index=True)
+    first_event_indexes = event_indexes[first_events]
+
+    states = np.zeros(arm_count, dtype=bool)
+    states[event_arms] = is_inside[first_event_indexes] & (steps[first_event_indexes] >= MIN_CENTER_ARM_LENGTH)
+    return states
+
+
 def digit_line_filter(lines):
     result = []
     for line in lines:
@@ -1,8 +1,8 @@
 from typing import List
 
-from lcd_digit_recognizer.recognition.primitives.open_line_wave import OpenLineWave
+from lcd_digit_recognizer.recognition.primitives.compact_line_wave import CompactLineWave
 from lcd_digit_recognizer.recognition.primitives.physical_line import PhysicalLine
-from lcd_digit_recognizer.recognition.primitives.scan_line import ScanLine
+from lcd_digit_recognizer.recognition.primitives.scan_line import ScanLine, ScanLineBatch
 
 
 class PhysicalLineRecognizer(object):
@@ -19,13 +19,20 @@ class PhysicalLineRecognizer(object):
 
         self._lines.append(line)
 
-    def get_physical_lines(self) -> List[PhysicalLine]:
-        wave = OpenLineWave(self._physical_line_skip_threshold, self._stall_limit, self._is_vertical)
+    def accept_image(self, image):
+        """
+        Accepts all rows of the image, same as calling accept for every row.
+        """
+        batch = ScanLineBatch(self._current_line_index, image)
+        self._current_line_index += batch.line_count
+
+        self._lines.append(batch)
 
-        for line in self._lines:
-            for center_point_index, width in line.physical_line_center_indexes():
-                wave.accept(center_point_index, width)
+    def get_physical_lines(self) -> List[PhysicalLine]:
+        wave = CompactLineWave(self._physical_line_skip_threshold, self._stall_limit, self._is_vertical)
 
-            wave.move()
+        for lines in self._lines:
+            for line_centers in lines.center_indexes_by_line():
+                wave.accept_line(line_centers)
 
-        return wave._collected_lines
+        return wave.collected_lines()
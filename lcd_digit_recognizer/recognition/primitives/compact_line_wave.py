@@ -0,0 +1,166 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from lcd_digit_recognizer.recognition.primitives.physical_line import PhysicalLine
+
+
+class CompactLineWave(object):
+    """
+    Array backed variant of OpenLineWave, it produces the same lines.
+
+    State of the lines is kept in preallocated arrays indexed by line slot (slots are given in the creation order),
+    the lookup of line ends is an array indexed by the center index, and points of all lines are appended
+    to a flat buffer. PhysicalLine objects are created only for the collected lines, at the end.
+    """
+
+    def __init__(self, skip_limit, stall_limit, is_vertical, line_capacity: int = 1024, max_index: int = 1024):
+        self._stall_limit = stall_limit
+        self._is_vertical = is_vertical
+
+        self._lookup_pattern = [0]
+        for i in range(1, skip_limit):
+            self._lookup_pattern.append(-i)
+            self._lookup_pattern.append(i)
+
+        self._current_line_index = 0
+        self._line_count = 0
+        self._open_slots: List[int] = []
+        self._collected_slots: List[int] = []
+
+        self._lookup_padding = skip_limit
+        self._lookup: List[int] = []
+        self._ensure_lookup(max_index)
+
+        self._line_starts: List[int] = []
+        self._last_indexes: List[int] = []
+        self._last_widths: List[int] = []
+        self._width_sums: List[int] = []
+        self._stall_times: List[int] = []
+        self._is_updated: List[bool] = []
+        self._ensure_capacity(line_capacity)
+
+        self._point_slots: List[int] = []
+        self._point_indexes: List[int] = []
+
+    def accept_line(self, center_indexes: Iterable[Tuple[int, int]]):
+        """
+        Accepts (center, width) pairs of a line and moves the wave to the next line
+        (same as OpenLineWave.accept for every pair followed by OpenLineWave.move).
+        """
+        lookup = self._lookup
+        lookup_pattern = self._lookup_pattern
+        padding = self._lookup_padding
+        last_indexes = self._last_indexes
+        last_widths = self._last_widths
+        width_sums = self._width_sums
+        stall_times = self._stall_times
+        is_updated = self._is_updated
+        point_slots = self._point_slots
+        point_indexes = self._point_indexes
+
+        for center_index, width in center_indexes:
+            if center_index + 2 * padding >= len(lookup):
+                self._ensure_lookup(center_index)
+                lookup = self._lookup
+
+            position = center_index + padding
+            for i in lookup_pattern:
+                slot = lookup[position + i]
+                if slot >= 0:
+                    if i != 0:
+                        lookup[position + i] = -1
+                        lookup[position] = slot
+
+                    stall_time = stall_times[slot]
+                    if stall_time:
+                        # stalled epochs are filled by the current point (see PhysicalLine.add)
+                        width_sums[slot] += width * stall_time
+                        point_slots.extend([slot] * stall_time)
+                        point_indexes.extend([center_index] * stall_time)
+                        stall_times[slot] = 0
+
+                    width_sums[slot] += width
+                    point_slots.append(slot)
+                    point_indexes.append(center_index)
+                    last_indexes[slot] = center_index
+                    last_widths[slot] = width
+                    is_updated[slot] = True
+                    break
+            else:
+                slot = self._add_line(center_index, width)
+                lookup[position] = slot
+
+        self._move()
+
+    def collected_lines(self) -> List[PhysicalLine]:
+        """
+        :return: lines in the order they were collected, lines which are still open are not included
+        """
+        if len(self._collected_slots) == 0:
+            return []
+
+        point_slots = np.array(self._point_slots, dtype=np.int64)
+        order = np.argsort(point_slots, kind="stable")
+        point_indexes = np.array(self._point_indexes, dtype=np.int64)[order].tolist()
+        point_offsets = np.concatenate([[0], np.cumsum(np.bincount(point_slots, minlength=self._line_count))]).tolist()
+
+        lines = []
+        for slot in self._collected_slots:
+            line = PhysicalLine.from_tracked_points(
+                self._line_starts[slot], point_indexes[point_offsets[slot]:point_offsets[slot + 1]],
+                self._width_sums[slot], self._last_widths[slot], self._stall_times[slot], self._is_vertical
+            )
+            lines.append(line)
+
+        return lines
+
+    def _add_line(self, center_index, width) -> int:
+        slot = self._line_count
+        if slot >= len(self._line_starts):
+            self._ensure_capacity(2 * len(self._line_starts))
+
+        self._line_count += 1
+        self._line_starts[slot] = self._current_line_index
+        self._last_indexes[slot] = center_index
+        self._last_widths[slot] = width
+        self._width_sums[slot] = width
+        self._stall_times[slot] = 0
+        self._is_updated[slot] = True
+        self._point_slots.append(slot)
+        self._point_indexes.append(center_index)
+
+        self._open_slots.append(slot)
+        return slot
+
+    def _move(self):
+        self._current_line_index += 1
+
+        is_updated = self._is_updated
+        stall_times = self._stall_times
+        open_slots = []
+        for slot in self._open_slots:
+            if is_updated[slot]:
+                is_updated[slot] = False
+                open_slots.append(slot)
+                continue
+
+            stall_times[slot] += 1
+            if stall_times[slot] > self._stall_limit:
+                self._collected_slots.append(slot)
+                self._lookup[self._last_indexes[slot] + self._lookup_padding] = -1
+            else:
+                open_slots.append(slot)
+
+        self._open_slots = open_slots
+
+    def _ensure_capacity(self, line_capacity):
+        missing = max(1, line_capacity) - len(self._line_starts)
+        for values, default in [(self._line_starts, 0), (self._last_indexes, 0), (self._last_widths, 0),
+                                (self._width_sums, 0), (self._stall_times, 0), (self._is_updated, False)]:
+            values.extend([default] * missing)
+
+    def _ensure_lookup(self, max_index):
+        size = max_index + 2 * self._lookup_padding + 1
+        if size > len(self._lookup):
+            self._lookup.extend([-1] * (size - len(self._lookup)))
@@ -48,5 +48,6 @@ class OpenLineWave(object):
             open_line.register_next_epoch()
             if open_line.current_stall_time > self._stall_limit:
                 self._open_lines.remove(open_line)
+                open_line.finalize()
                 self._collected_lines.append(open_line)
                 del self._lookup[open_line._last_index]
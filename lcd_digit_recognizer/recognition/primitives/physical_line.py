@@ -7,6 +7,14 @@ from lcd_digit_recognizer.recognition.utils import angle_between, unit_vector, a
 
 
 class PhysicalLine(object):
+    """
+    Line tracked through the scan lines. Once the line is closed it gets finalized, its geometry
+    is computed once and the line can't be changed anymore.
+    """
+    __slots__ = ["_stall_time", "_line_start", "_last_index", "_last_width", "_is_updated", "_width_sum",
+                 "_point_indexes", "_absolute_angle", "_direction", "_start_point", "_end_point", "_center",
+                 "_metric_length", "is_vertical", "joints"]
+
     def __init__(self, line_start, initial_index, width, is_vertical):
         self._stall_time = 0
         self._line_start = line_start
@@ -17,11 +25,51 @@ class PhysicalLine(object):
         self._point_indexes: List[int] = []
         self._absolute_angle = None
         self._direction = None
+        self._start_point = None
+        self._end_point = None
+        self._center = None
+        self._metric_length = None
         self.is_vertical = is_vertical
         self.joints: List['Joint'] = []
 
         self.add(initial_index, width)
 
+    @classmethod
+    def from_tracked_points(cls, line_start, point_indexes: List[int], width_sum, last_width, stall_time,
+                            is_vertical) -> 'PhysicalLine':
+        """
+        Creates a line from points tracked outside of the line (see CompactLineWave).
+        """
+        line = cls(line_start, point_indexes[0], last_width, is_vertical)
+        line._point_indexes = point_indexes
+        line._width_sum = width_sum
+        line._last_index = point_indexes[-1]
+        line._stall_time = stall_time
+        line._is_updated = False
+        line.finalize()
+
+        return line
+
+    @property
+    def is_finalized(self):
+        return self._start_point is not None
+
+    def finalize(self):
+        """
+        Computes endpoints, center and lengths of the closed line.
+        Direction and angle are computed on their first use (only a fraction of lines gets that far).
+        """
+        if self.is_finalized:
+            return
+
+        x = self._line_start
+        self._start_point = self._handle_vertical_flipping(x, self._point_indexes[0])
+        self._end_point = self._handle_vertical_flipping(x + len(self._point_indexes) - 1, self._point_indexes[-1])
+        self._center = self._calculate_center()
+
+        s, e = self._start_point, self._end_point
+        self._metric_length = np.sqrt((s[0] - e[0]) ** 2 + (s[1] - e[1]) ** 2)
+
     @property
     def line_start(self):
         return self._line_start
@@ -32,9 +80,10 @@ class PhysicalLine(object):
 
     @property
     def metric_length(self):
-        ps = list(self.significant_points)
-        s = ps[0]
-        e = ps[-1]
+        if self._metric_length is not None:
+            return self._metric_length
+
+        s, e = self.significant_points
         return np.sqrt((s[0] - e[0]) ** 2 + (s[1] - e[1]) ** 2)
 
     @property
@@ -103,24 +152,27 @@ class PhysicalLine(object):
 
     @property
     def significant_points(self):
-        ps = list(self.points)
-        yield ps[0]
-        yield ps[-1]
-        return
+        if self._start_point is not None:
+            return self._start_point, self._end_point
 
         x = self._line_start
-        y = self._point_indexes[0]
-
-        yield self._handle_vertical_flipping(x, y)
+        start_point = self._handle_vertical_flipping(x, self._point_indexes[0])
 
         # if len(self._point_indexes) > 2:
         #    middle = self.length // 2
         #    yield self._handle_vertical_flipping(x + middle, self._point_indexes[middle])
 
-        yield self._handle_vertical_flipping(x + self.length, self._point_indexes[-1])
+        end_point = self._handle_vertical_flipping(x + self.length - 1, self._point_indexes[-1])
+        return start_point, end_point
 
     @property
     def center(self):
+        if self._center is not None:
+            return self._center
+
+        return self._calculate_center()
+
+    def _calculate_center(self):
         middle = self.length // 2
         x = self._line_start + middle
         cy = self._point_indexes[middle]
@@ -160,6 +212,8 @@ class PhysicalLine(object):
             self._stall_time += 1
 
     def remove_curvature(self, curvature_threshold):
+        self._assert_not_finalized()
+
         centered_diff = np.array(self._point_indexes) - self._point_indexes[len(self._point_indexes) // 2]
         slope = self._diff(centered_diff)
         curvature = self._diff(slope)
@@ -218,6 +272,7 @@ class PhysicalLine(object):
         return abs(self._last_index - point_index)
 
     def add(self, index, width):
+        self._assert_not_finalized()
         self._is_updated = True
 
         for _ in range(self._stall_time):
@@ -230,6 +285,10 @@ class PhysicalLine(object):
         self._last_width = width
         self._point_indexes.append(index)
 
+    def _assert_not_finalized(self):
+        if self.is_finalized:
+            raise AssertionError("Finalized line can't be changed")
+
     def _handle_vertical_flipping(self, x, y):
         if self.is_vertical:
             return (y, x)
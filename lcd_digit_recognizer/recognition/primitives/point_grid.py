@@ -0,0 +1,65 @@
+import math
+from typing import Dict, List, Tuple
+
+
+class PointGrid(object):
+    """
+    Uniform grid of keyed points for radius queries.
+
+    Points are bucketed by cells of the given size, so a query visits only cells of the square around the query point.
+    """
+
+    def __init__(self, cell_size: float):
+        if not cell_size > 0:
+            raise AssertionError("cell_size has to be positive")
+
+        self._cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._positions: Dict[int, Tuple[int, int]] = {}
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    def add(self, key: int, x, y):
+        cell = self._get_cell(x, y)
+        self._cells.setdefault(cell, []).append(key)
+        self._positions[key] = cell
+
+    def remove(self, key: int):
+        cell = self._positions.pop(key)
+        keys = self._cells[cell]
+        keys.remove(key)
+        if not keys:
+            del self._cells[cell]
+
+    def move(self, key: int, x, y):
+        if self._positions[key] != self._get_cell(x, y):
+            self.remove(key)
+            self.add(key, x, y)
+
+    def query(self, x, y, radius) -> List[int]:
+        """
+        :return: keys of the points which may be closer than radius (a superset of them), in ascending order
+        """
+        cx0, cy0 = self._get_cell(x - radius, y - radius)
+        cx1, cy1 = self._get_cell(x + radius, y + radius)
+
+        result = []
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # the square is larger than the occupied area
+            for (cx, cy), keys in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    result.extend(keys)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    keys = self._cells.get((cx, cy))
+                    if keys:
+                        result.extend(keys)
+
+        result.sort()
+        return result
+
+    def _get_cell(self, x, y) -> Tuple[int, int]:
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
@@ -29,6 +29,55 @@ class ScanLine(object):
     def physical_line_center_indexes(self) -> List[Tuple[int, int]]:
         return list(self._centers)
 
+    def center_indexes_by_line(self):
+        yield self.physical_line_center_indexes()
+
     @property
     def is_empty(self):
         return len(self._centers) == 0
+
+
+class ScanLineBatch(object):
+    """
+    Scan lines of all rows of an image at once.
+
+    Centers of all lines are stored in flat arrays, centers of line i are centers[line_offsets[i]:line_offsets[i + 1]]
+    (and the same for widths). The centers are the same as ScanLine finds row by row.
+    """
+
+    def __init__(self, first_line_index, pixel_lines: np.ndarray, min_width: int = 5):
+        self.first_line_index = first_line_index
+        self.line_count = pixel_lines.shape[0]
+
+        rows, columns = np.nonzero(pixel_lines)
+
+        # next active pixel at least min_width away in the same row
+        keys = rows * (pixel_lines.shape[1] + min_width) + columns
+        next_indexes = np.searchsorted(keys, keys + min_width)
+        has_next = next_indexes < len(keys)
+        has_next[has_next] = rows[next_indexes[has_next]] == rows[has_next]
+
+        # every line is a chain of pixels (starting at its first active pixel) connected by the next pixels
+        is_chained = np.zeros(len(keys), dtype=bool)
+        frontier = np.searchsorted(rows, np.unique(rows))
+        while len(frontier):
+            is_chained[frontier] = True
+            frontier = next_indexes[frontier[has_next[frontier]]]
+
+        starts = np.nonzero(is_chained & has_next)[0]
+        ends = next_indexes[starts]
+
+        self.centers = (columns[starts] + columns[ends]) // 2
+        self.widths = columns[ends] - columns[starts]
+        self.line_offsets = np.searchsorted(rows[starts], np.arange(self.line_count + 1))
+
+    def center_indexes_by_line(self):
+        """
+        :return: iterator of (center, width) pairs of every line, in line order
+        """
+        centers = self.centers.tolist()
+        widths = self.widths.tolist()
+        line_offsets = self.line_offsets.tolist()
+        for line_index in range(self.line_count):
+            start, end = line_offsets[line_index], line_offsets[line_index + 1]
+            yield zip(centers[start:end], widths[start:end])
@@ -43,7 +43,7 @@ class LocalRecognitionWorker(object):
         image_id = job["image_id"]
 
         try:
-            number, metadata = recognize_number.recognize_number(image)
+            number, metadata = recognize_number.recognize_number(image, sid)
         except Exception as e:
             print(f"RECOGNIZER EXCEPTION: {e}")
             formatted_exception = traceback.format_exc()
@@ -3,10 +3,11 @@ from typing import List, Tuple, Optional, Dict
 import cv2
 import numpy as np
 
-from recognize_seven_segment.detectors.detect_display import detect_display_v2
-from recognize_seven_segment.utils.adaptively_match_digit import adaptively_match_digit_hypotheses
-from recognize_seven_segment.utils.generate_digit import generate_digit_easy_gluko
-from recognize_seven_segment.utils.get_leading_rectangles import get_leading_rectangles
+from recognize_seven_segment.detectors.detect_display import detect_display_v2, detect_display_ranked
+from recognize_seven_segment.utils.adaptively_match_digit import adaptively_match_digit_hypotheses, \
+    adaptively_match_templates
+from recognize_seven_segment.utils.generate_digit import get_digit_template_easy_gluko
+from recognize_seven_segment.utils.get_leading_rectangles import get_leading_rectangles_vectorized
 from recognize_seven_segment.utils.input_output import load_image, list_image_paths, get_image_name, \
     create_dir_if_it_doesnt_exist
 from recognize_seven_segment.utils.leading_rectangles_to_str import leading_rectangles_to_str
@@ -14,41 +15,131 @@ from recognize_seven_segment.utils.plot_rectangle import plot_rectangle
 from recognize_seven_segment.utils.preprocess import preprocess
 from recognize_seven_segment.utils.threshold import threshold_colored
 
+CONFIDENT_READING_THRESHOLD = 0.9  # mean match coefficient of a reading which ends the display candidate search
+
 
 def detect_digit_hypotheses(digit: int, image: np.ndarray, scale_iterations: int = 10,
                             scale_min: float = 0.5, scale_max: float = 1.0,
-                            match_threshold: float = 0.6) -> List[Tuple[List[int], float]]:
+                            match_threshold: float = 0.6,
+                            non_maximum_suppression: Optional[str] = None,
+                            coarse_factor: Optional[float] = None) -> List[Tuple[List[int], float]]:
     """
     :return: list of digit occurences ((x0, y0, x1, y1), confidence)
     """
     image_height, image_width = image.shape
 
-    template = generate_digit_easy_gluko(digit, image_width // 7)
+    template = get_digit_template_easy_gluko(digit, image_width // 7)
 
-    return adaptively_match_digit_hypotheses(template, image, scale_iterations, scale_min, scale_max, match_threshold)
+    return adaptively_match_digit_hypotheses(template, image, scale_iterations, scale_min, scale_max, match_threshold,
+                                             non_maximum_suppression, coarse_factor)
 
 
 def detect_hypothesis(image: np.ndarray, scale_iterations: int = 10,
                       scale_min: float = 0.5, scale_max: float = 1.0,
-                      match_threshold: float = 0.8) -> List[Tuple[List[int], float, int]]:
+                      match_threshold: float = 0.8,
+                      non_maximum_suppression: Optional[str] = None,
+                      coarse_factor: Optional[float] = None,
+                      thread_count: int = 1) -> List[Tuple[List[int], float, int]]:
     # TODO: default match threshold could be 0.7 or even maybe 0.5 and it still wouldn't hurt accuracy
     # but the performance will go down
     """
     :return: list of digit occurences ((x0, y0, x1, y1), confidence)
     """
+    image_height, image_width = image.shape
+
+    templates = {digit: get_digit_template_easy_gluko(digit, image_width // 7) for digit in range(10)}
+    digit_hypotheses = adaptively_match_templates(templates, image, scale_iterations,
+                                                  scale_min, scale_max, match_threshold, non_maximum_suppression,
+                                                  coarse_factor=coarse_factor, thread_count=thread_count)
+
     rectangles = []
     for digit in range(10):
-        digit_rectangles = detect_digit_hypotheses(digit, image, scale_iterations,
-                                                   scale_min, scale_max, match_threshold)
-        digit_rectangles = [tuple(list(rectangle) + [digit]) for rectangle in digit_rectangles]
+        digit_rectangles = [tuple(list(rectangle) + [digit]) for rectangle in digit_hypotheses[digit]]
         rectangles.extend(digit_rectangles)
 
     return rectangles
 
 
-def detect_digits(image: np.ndarray) -> Tuple[Optional[str], Dict]:
+def detect_display_easy_gluko(image: np.ndarray, majority_vote: bool = False) -> List[np.ndarray]:
+    """
+    The display detection step of detect_digits, it takes the same parameters.
+
+    :return: display candidates, can be passed to detect_digits as lcd_displays
+    """
     image = preprocess(image)
-    lcd_displays = detect_display_v2(image)
+    if majority_vote:
+        return detect_display_v2(image)
+
+    return detect_display_ranked(image)
+
+
+def read_display(lcd_display: np.ndarray) -> Tuple[str, List[Tuple[List[int], float, int]]]:
+    """
+    :return: (annotation, leading rectangles), the annotation is "no_rectangles_found"
+        or "no_leading_rectangles_found" when the display can't be read
+    """
+    lcd_display = threshold_colored(lcd_display)
+    rectangles = detect_hypothesis(lcd_display)
+    if len(rectangles) < 2:
+        annotation = "no_rectangles_found"
+    else:
+        rectangles = get_leading_rectangles_vectorized(rectangles)
+
+        if len(rectangles) < 2:
+            annotation = "no_leading_rectangles_found"
+        else:
+            annotation = leading_rectangles_to_str(rectangles)
+
+    return annotation, rectangles
+
+
+def detect_digits(image: np.ndarray, majority_vote: bool = False,
+                  lcd_displays: Optional[List[np.ndarray]] = None) -> Tuple[Optional[str], Dict]:
+    """
+    :param majority_vote: read all display candidates and return the most frequent reading,
+        by default the deduplicated candidates are read in rank order until a reading is confident
+        (see CONFIDENT_READING_THRESHOLD), otherwise the most confident reading is returned
+    :param lcd_displays: display candidates found by detect_display_easy_gluko with the same parameters,
+        the display detection is skipped then
+    """
+    if majority_vote:
+        return detect_digits_majority_vote(image, lcd_displays)
+
+    if lcd_displays is None:
+        lcd_displays = detect_display_easy_gluko(image)
+
+    if len(lcd_displays) == 0:
+        return None, {"display_detected": False}
+
+    best_reading = None
+    best_confidence = -1
+    for lcd_display in lcd_displays:
+        annotation, rectangles = read_display(lcd_display)
+        if annotation == "no_rectangles_found" or annotation == "no_leading_rectangles_found":
+            continue
+
+        confidence = np.mean([match_coeff for _, match_coeff, _ in rectangles])
+        if confidence > best_confidence:
+            best_reading = annotation, rectangles, lcd_display
+            best_confidence = confidence
+
+        if confidence >= CONFIDENT_READING_THRESHOLD:
+            break
+
+    if best_reading is None:
+        return None, {"display_detected": True}
+
+    top_annotation, top_rectangles, top_lcd_display = best_reading
+    for rectangle in top_rectangles:
+        plot_rectangle(top_lcd_display, rectangle)
+
+    return top_annotation, {"display_detected": True, "annotated_image": top_lcd_display}
+
+
+def detect_digits_majority_vote(image: np.ndarray,
+                                lcd_displays: Optional[List[np.ndarray]] = None) -> Tuple[Optional[str], Dict]:
+    if lcd_displays is None:
+        lcd_displays = detect_display_easy_gluko(image, majority_vote=True)
 
     if len(lcd_displays) == 0:
         return None, {"display_detected": False}
@@ -57,18 +148,7 @@ def detect_digits(image: np.ndarray) -> Tuple[Optional[str], Dict]:
     display_rectangles = []
 
     for lcd_display in lcd_displays:
-        lcd_display = threshold_colored(lcd_display)
-        rectangles = detect_hypothesis(lcd_display)
-        if len(rectangles) < 2:
-            annotation = "no_rectangles_found"
-        else:
-            rectangles = get_leading_rectangles(rectangles)
-
-            if len(rectangles) < 2:
-                annotation = "no_leading_rectangles_found"
-            else:
-                annotation = leading_rectangles_to_str(rectangles)
-
+        annotation, rectangles = read_display(lcd_display)
         display_rectangles.append(rectangles)
         display_annotations.append(annotation)
 
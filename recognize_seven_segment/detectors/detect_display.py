@@ -1,26 +1,67 @@
-from typing import List
+from typing import List, Tuple
 
 import cv2
 import imutils
 import numpy as np
 
+from recognize_seven_segment.utils.non_maximum_suppression import suppress_overlapping_rectangles
 from recognize_seven_segment.utils.perspective_transformation import perspective_transformation
 from recognize_seven_segment.utils.input_output import load_image, list_image_paths, get_image_name, \
     create_dir_if_it_doesnt_exist
 from recognize_seven_segment.utils.preprocess import preprocess
 
+DUPLICATE_DISPLAY_IOU = 0.7  # candidates overlapping more are the same display (e.g. nested contours)
+
 
 def detect_display_v2(image: np.ndarray,
                       max_edge_ratio: float = 1.5,
                       min_display_dimension: int = 100,
                       max_orig_to_rotated_ratio: float = 1.3) -> List[np.ndarray]:
-    orig = image.copy()
+    lcd_displays = []
+    for box, _ in find_display_candidates(image, max_edge_ratio, min_display_dimension, max_orig_to_rotated_ratio):
+        lcd_display = perspective_transformation(image, box)
+        lcd_displays.append(lcd_display)
+
+    return lcd_displays
+
+
+def detect_display_ranked(image: np.ndarray,
+                          max_edge_ratio: float = 1.5,
+                          min_display_dimension: int = 100,
+                          max_orig_to_rotated_ratio: float = 1.3,
+                          iou_threshold: float = DUPLICATE_DISPLAY_IOU) -> List[np.ndarray]:
+    """
+    Variant of detect_display_v2 without duplicates - nested contours of the same display are suppressed.
+
+    :return: warped displays ordered from the most probable one (see find_display_candidates)
+    """
+    candidates = find_display_candidates(image, max_edge_ratio, min_display_dimension, max_orig_to_rotated_ratio)
+
+    rectangles = []
+    for box, score in candidates:
+        x, y, w, h = cv2.boundingRect(box)
+        rectangles.append(([x, y, x + w, y + h], score, box))
+
+    rectangles = suppress_overlapping_rectangles(rectangles, iou_threshold)
+    rectangles.sort(key=lambda rectangle: rectangle[1], reverse=True)
+
+    return [perspective_transformation(image, box) for _, _, box in rectangles]
+
+
+def find_display_candidates(image: np.ndarray,
+                            max_edge_ratio: float = 1.5,
+                            min_display_dimension: int = 100,
+                            max_orig_to_rotated_ratio: float = 1.3) -> List[Tuple[np.ndarray, float]]:
+    """
+    :return: list of (box corners, score) in the contour order, the score is the ratio of the contour area
+        and the area of its box - displays are rectangles, so their contours fill the box
+    """
     image = cv2.GaussianBlur(src=image, ksize=(5, 5), sigmaX=0)
     image = cv2.Canny(image, threshold1=0, threshold2=50)
     contours = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
     contours = imutils.grab_contours(contours)
 
-    lcd_displays = []
+    candidates = []
     for contour in contours:
         if len(contour) < 3:
             continue
@@ -34,14 +75,16 @@ def detect_display_v2(image: np.ndarray,
         if mw / w < max_orig_to_rotated_ratio and w / mw < max_orig_to_rotated_ratio \
                 and h / mh < max_orig_to_rotated_ratio and mh / h < max_orig_to_rotated_ratio:
             box = cv2.boxPoints(((mx, my), (mw, mh), rot))
+            box_area = mw * mh
         else:
             box = cv2.boxPoints(((x, y), (w, h), 0))
+            box_area = w * h
 
         box = np.int0(box)
-        lcd_display = perspective_transformation(orig, box)
-        lcd_displays.append(lcd_display)
+        score = min(1.0, cv2.contourArea(contour) / max(box_area, 1.0))
+        candidates.append((box, score))
 
-    return lcd_displays
+    return candidates
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from recognize_seven_segment.utils.get_leading_rectangles import get_leading_rectangles, \
+    get_leading_rectangles_vectorized
+
+
+def generate_rectangles(count: int, seed: int = 0) -> List[Tuple[List[int], float, int]]:
+    """
+    Raw-match-like hypotheses - jittered clusters around three digit positions plus uniform noise.
+    """
+    random = np.random.RandomState(seed)
+    digit_positions = [(30, 60), (110, 60), (190, 60)]
+    digit_width, digit_height = 70, 130
+
+    rectangles = []
+    for i in range(count):
+        if random.rand() < 0.8:
+            x, y = digit_positions[random.randint(len(digit_positions))]
+            x += random.randint(-6, 7)
+            y += random.randint(-6, 7)
+        else:
+            x, y = random.randint(0, 350), random.randint(0, 200)
+
+        scale = random.uniform(0.8, 1.2)
+        coordinates = [x, y, x + int(digit_width * scale), y + int(digit_height * scale)]
+        confidence = np.float32(random.uniform(0.6, 1.0))
+        rectangles.append((coordinates, confidence, random.randint(10)))
+
+    return rectangles
+
+
+def benchmark(counts: List[int], repetitions: int = 3):
+    print(f"{'rectangles':>10} {'python [s]':>12} {'numpy [s]':>12} {'speedup':>8}")
+    for count in counts:
+        rectangles = generate_rectangles(count, seed=count)
+
+        start = time.time()
+        for _ in range(repetitions):
+            expected = get_leading_rectangles(rectangles)
+        python_time = (time.time() - start) / repetitions
+
+        start = time.time()
+        for _ in range(repetitions):
+            actual = get_leading_rectangles_vectorized(rectangles)
+        numpy_time = (time.time() - start) / repetitions
+
+        if actual != expected:
+            raise AssertionError(f"Vectorized result differs for {count} rectangles: {actual} != {expected}")
+
+        print(f"{count:>10} {python_time:>12.4f} {numpy_time:>12.4f} {python_time / numpy_time:>8.1f}")
+
+
+if __name__ == "__main__":
+    benchmark([10, 100, 500, 1000, 2000])
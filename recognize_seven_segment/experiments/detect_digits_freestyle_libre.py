@@ -1,52 +1,105 @@
+import math
 from typing import List, Tuple, Dict, Optional
 
 import cv2
 import imutils
 import numpy as np
 
-from recognize_seven_segment.utils.adaptively_match_digit import adaptively_match_digit_hypotheses
+from recognize_seven_segment.utils.adaptively_match_digit import adaptively_match_digit_hypotheses, \
+    adaptively_match_templates
 from recognize_seven_segment.utils.describe_arrow_type import describe_arrow
+from recognize_seven_segment.utils.display_tracker import DisplayTracker
 from recognize_seven_segment.utils.perspective_transformation import perspective_transformation
-from recognize_seven_segment.utils.generate_digit import generate_digit_freestyle_libre
-from recognize_seven_segment.utils.get_leading_rectangles import get_leading_rectangles
+from recognize_seven_segment.utils.generate_digit import get_digit_template_freestyle_libre, freestyle_libre_digits
+from recognize_seven_segment.utils.get_leading_rectangles import get_leading_rectangles_vectorized
 from recognize_seven_segment.utils.input_output import load_image, list_image_paths, get_image_name, \
     create_dir_if_it_doesnt_exist
 from recognize_seven_segment.utils.leading_rectangles_to_str import leading_rectangles_to_str
 from recognize_seven_segment.utils.plot_rectangle import plot_rectangle
+from recognize_seven_segment.utils.preprocess import extract_channel
+from recognize_seven_segment.utils.threshold import threshold_display
+from recognize_seven_segment.utils.segment_digits import find_digit_blobs, classify_blobs, get_ink_height_ratio
+from recognize_seven_segment.utils.stage_timer import StageTimer
 
+# Canonical display normalization - the display is warped to a fixed size, so the glyph size is known
+# and digits are matched in a narrow band of scales only.
+# The band is the middle of the full sweep, tune it with the evaluation harness for new devices.
+CANONICAL_DISPLAY_SIZE = (420, 300)  # (width, height)
+CANONICAL_DIGIT_SCALES = {"scale_min": 0.7, "scale_max": 0.8, "scale_iterations": 2}
 
-def threshold_image(image: np.ndarray):
-    image = cv2.pyrMeanShiftFiltering(image, 21, 51)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    ret, threshold = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return threshold
+ARROW_TO_DIGIT_WIDTH_RATIO = 1.0  # arrow and digit glyphs of the font have the same width
+ARROW_DIGIT_SCALES = {"scale_min": 0.7, "scale_max": 1.3, "scale_iterations": 5}  # around the digit scale
+ARROW_EARLY_STOP_THRESHOLD = 0.9  # an arrow matching this well is not compared with the remaining ones
+
+# Resolution-adaptive display detection (factor=None) - the filters of the detection are tuned for
+# 640x480 frames downscaled by 2, larger inputs are downscaled to the same working size.
+DISPLAY_DETECTION_LONG_EDGE = 320
+DISPLAY_DETECTION_MIN_SIDE = 50  # minimal display side in the working image (100 px of a 640x480 frame)
+MAX_DISPLAY_ASPECT_RATIO = 2.  # longer to shorter side of the display box
+
+DIGIT_INK_HEIGHT_RATIOS = [get_ink_height_ratio(freestyle_libre_digits[str(digit)]) for digit in range(10)]
+MIN_SEGMENTED_DIGITS = 2  # segmentation finding less digits falls back to the template sweep
+
+STAGE_TIMER = StageTimer()  # aggregates the stage durations of all detect_digits_freestyle_libre calls of the process
+
+
+def threshold_image(image: np.ndarray, strategy: Optional[str] = None):
+    """
+    :param strategy: one of THRESHOLD_STRATEGIES, DEFAULT_THRESHOLD_STRATEGY (of the deployment) by default
+    """
+    return threshold_display(image, strategy)
 
 
 def detect_digit_hypotheses(digit: int, image: np.ndarray, scale_iterations: int = 5,
                             scale_min: float = 0.5, scale_max: float = 1.0,
-                            match_threshold: float = 0.6) -> List[Tuple[List[int], float]]:
+                            match_threshold: float = 0.6,
+                            non_maximum_suppression: Optional[str] = None,
+                            coarse_factor: Optional[float] = None) -> List[Tuple[List[int], float]]:
     """
     :return: list of digit occurences ((x0, y0, x1, y1), confidence)
     """
     image_height, image_width = image.shape
 
-    template = generate_digit_freestyle_libre(digit, image_width // 7)
+    template = get_digit_template_freestyle_libre(digit, image_width // 7)
 
-    return adaptively_match_digit_hypotheses(template, image, scale_iterations, scale_min, scale_max, match_threshold)
+    return adaptively_match_digit_hypotheses(template, image, scale_iterations, scale_min, scale_max, match_threshold,
+                                             non_maximum_suppression, coarse_factor)
 
 
-def detect_arrow(image: np.array) -> str:
+def detect_arrow(image: np.array, scale_min: float = 0.3, scale_max: float = 2.0,
+                 scale_iterations: int = 15, digit_width: Optional[int] = None,
+                 early_stop_threshold: Optional[float] = None, thread_count: int = 1) -> str:
+    """
+    :param digit_width: width of the recognized digits - arrow templates are generated at the corresponding
+        arrow size, so the scale sweep can be narrow (see ARROW_DIGIT_SCALES)
+    :param early_stop_threshold: remaining arrow types are skipped once an arrow matches at least this well
+    :param thread_count: with more threads all arrow types are matched at once (early stopping then saves
+        no work, but the result is the same)
+    """
     arrow_types = ["up", "down", "up_right", "down_right", "right"]
     top_arrow_type = ""
     top_arrow_type_match_coeff = -1
 
+    template_width = 40
+    if digit_width is not None:
+        template_width = max(1, int(digit_width * ARROW_TO_DIGIT_WIDTH_RATIO))
+
+    templates = {arrow_type: get_digit_template_freestyle_libre(arrow_type, template_width)
+                 for arrow_type in arrow_types}
+    hypotheses = {}
+    if thread_count > 1:
+        hypotheses = adaptively_match_templates(templates, image, scale_iterations, scale_min, scale_max,
+                                                match_threshold=0.5, thread_count=thread_count)
+
     for arrow_type in arrow_types:
-        hypothesis = adaptively_match_digit_hypotheses(generate_digit_freestyle_libre(arrow_type),
-                                                       image,
-                                                       scale_min=0.3,
-                                                       scale_max=2.0,
-                                                       scale_iterations=15,
-                                                       match_threshold=0.5)
+        hypothesis = hypotheses.get(arrow_type)
+        if hypothesis is None:
+            hypothesis = adaptively_match_digit_hypotheses(templates[arrow_type],
+                                                           image,
+                                                           scale_min=scale_min,
+                                                           scale_max=scale_max,
+                                                           scale_iterations=scale_iterations,
+                                                           match_threshold=0.5)
         hypothesis.sort(key=lambda rectangle: rectangle[1], reverse=True)
         if len(hypothesis) == 0:
             continue
@@ -56,34 +109,100 @@ def detect_arrow(image: np.array) -> str:
             top_arrow_type = arrow_type
             top_arrow_type_match_coeff = match_coeff
 
+        if early_stop_threshold is not None and top_arrow_type_match_coeff >= early_stop_threshold:
+            break
+
     return top_arrow_type
 
 
 def detect_hypothesis(image: np.ndarray, scale_iterations: int = 10,
                       scale_min: float = 0.5, scale_max: float = 1.0,
-                      match_threshold: float = 0.7) -> List[Tuple[List[int], float, int]]:
+                      match_threshold: float = 0.7,
+                      non_maximum_suppression: Optional[str] = None,
+                      coarse_factor: Optional[float] = None,
+                      thread_count: int = 1) -> List[Tuple[List[int], float, int]]:
     """
     :return: list of digit occurences ((x0, y0, x1, y1), confidence)
     """
+    image_height, image_width = image.shape
+
+    templates = {digit: get_digit_template_freestyle_libre(digit, image_width // 7) for digit in range(10)}
+    digit_hypotheses = adaptively_match_templates(templates, image, scale_iterations,
+                                                  scale_min, scale_max, match_threshold, non_maximum_suppression,
+                                                  coarse_factor=coarse_factor, thread_count=thread_count)
+
     rectangles = []
     for digit in range(10):
-        digit_rectangles = detect_digit_hypotheses(digit, image, scale_iterations,
-                                                   scale_min, scale_max, match_threshold)
-        digit_rectangles = [tuple(list(rectangle) + [digit]) for rectangle in digit_rectangles]
+        digit_rectangles = [tuple(list(rectangle) + [digit]) for rectangle in digit_hypotheses[digit]]
         rectangles.extend(digit_rectangles)
 
     return rectangles
 
 
-def detect_display_freestyle_libre(image: np.ndarray, factor=2) -> List[np.ndarray]:
-    orig = image.copy()
-    w, h, _ = image.shape
-    image = cv2.resize(image, (int(h // factor), int(w // factor)))
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    hsv_image = hsv_image[:, :, 2]
+def detect_hypothesis_segmented(image: np.ndarray,
+                                match_threshold: float = 0.7) -> List[Tuple[List[int], float, int]]:
+    """
+    Segments the display into digit blobs and classifies every blob once, instead of sweeping
+    all templates over all scales of the whole display.
+
+    :return: list of digit occurences ((x0, y0, x1, y1), confidence, digit), at most one per blob
+    """
+    blobs = find_digit_blobs(image)
+    return classify_blobs(image, blobs, get_digit_template_freestyle_libre, list(range(10)),
+                          DIGIT_INK_HEIGHT_RATIOS, match_threshold)
+
+
+def mean_inside_box(channel: np.ndarray, box: np.ndarray) -> float:
+    """
+    Mean of the channel inside a (rotated) box, computed only over the bounding rectangle of the box.
+
+    :param box: array of 4 (x, y) corners, may be partially outside of the channel
+    """
+    channel_height, channel_width = channel.shape
+    x, y, width, height = cv2.boundingRect(box)
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(channel_width, x + width), min(channel_height, y + height)
+    if x1 <= x0 or y1 <= y0:
+        return 0.0
+
+    mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+    cv2.drawContours(mask, [box], -1, 255, -1, offset=(-x0, -y0))
 
-    e = image
-    e = cv2.cvtColor(e, cv2.COLOR_BGR2GRAY)
+    return cv2.mean(channel[y0:y1, x0:x1], mask=mask)[0]
+
+
+def get_display_detection_factor(image_shape: Tuple[int, ...]) -> float:
+    """
+    :return: downscale factor giving the working image of DISPLAY_DETECTION_LONG_EDGE (never upscales)
+    """
+    return max(1.0, max(image_shape[:2]) / float(DISPLAY_DETECTION_LONG_EDGE))
+
+
+def find_display_box_freestyle_libre(image: np.ndarray, factor: Optional[float] = 2) -> Optional[np.ndarray]:
+    """
+    :param factor: downscale factor of the image the display is searched in, None picks it
+        by get_display_detection_factor, so high resolution inputs cost the same as small ones
+    :param image: BGR image or a single channel image (see extract_channel), which is then used
+        both for the edges and for the brightness of the candidates
+    :return: array of 4 (x, y) corners of the display in the image or None when no display is found
+    """
+    interpolation = cv2.INTER_LINEAR
+    min_side = 100 / factor if factor is not None else DISPLAY_DETECTION_MIN_SIDE
+    if factor is None:
+        factor = get_display_detection_factor(image.shape)
+        interpolation = cv2.INTER_AREA  # no aliasing of large downscales
+
+    w, h = image.shape[:2]
+    image = cv2.resize(image, (int(h // factor), int(w // factor)), interpolation=interpolation)
+    if image.ndim == 2:
+        hsv_image = image
+        e = image
+    else:
+        hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hsv_image = hsv_image[:, :, 2]
+
+        e = image
+        e = cv2.cvtColor(e, cv2.COLOR_BGR2GRAY)
     # e = cv2.cvtColor(e, cv2.COLOR_BGR2HSV)
     # e = e[:,:,2]
     # return [e]
@@ -106,46 +225,161 @@ def detect_display_freestyle_libre(image: np.ndarray, factor=2) -> List[np.ndarr
         if len(contour) < 3:
             continue
 
+        # cheap bounds of the checks below, they skip only contours which can't pass them:
+        # - the upright bounding rectangle is never smaller than the rotated one
+        # - the contour touches all sides of its rotated rectangle, so both upright sides are at least
+        #   min_side / sqrt(2) and their aspect ratio is at most MAX_DISPLAY_ASPECT_RATIO + 1 at any rotation
+        _, _, bounding_width, bounding_height = cv2.boundingRect(contour)
+        if bounding_width * bounding_height < min_side * min_side:
+            continue
+
+        if min(bounding_width, bounding_height) < min_side / math.sqrt(2):
+            continue
+
+        if max(bounding_width, bounding_height) > (MAX_DISPLAY_ASPECT_RATIO + 1) * min(bounding_width, bounding_height):
+            continue
+
         min_area_rectangle = cv2.minAreaRect(contour)
         (x, y), (w, h), _ = min_area_rectangle
 
-        if w < 100 / factor or h < 100 / factor:
+        if w < min_side or h < min_side:
             continue
 
-        if max(w / h, h / w) > 2.:
+        if max(w / h, h / w) > MAX_DISPLAY_ASPECT_RATIO:
             continue
 
         box = cv2.boxPoints(min_area_rectangle)
         box = np.int0(box)
 
-        mask = np.zeros(image.shape[:2], np.uint8)
-        cv2.drawContours(mask, [box], -1, 255, -1)
-
-        mean_color = cv2.mean(hsv_image, mask=mask)[0]
+        mean_color = mean_inside_box(hsv_image, box)
         boxes.append((box, mean_color))
 
     if len(boxes) == 0:
-        return []
+        return None
 
     boxes.sort(key=lambda box: -box[1])
-    lcd_display = perspective_transformation(orig, boxes[0][0] * factor)
-    lcd_display = threshold_image(lcd_display)
+    return np.round(boxes[0][0] * factor).astype(boxes[0][0].dtype)
+
+
+def detect_display_freestyle_libre(image: np.ndarray, factor: Optional[float] = 2,
+                                   display_size: Optional[Tuple[int, int]] = None,
+                                   threshold_strategy: Optional[str] = None,
+                                   tracker: Optional[DisplayTracker] = None) -> List[np.ndarray]:
+    """
+    :param factor: downscale factor of the display search, see find_display_box_freestyle_libre
+    :param display_size: (width, height) the display is warped to, by default its measured size is kept
+    :param threshold_strategy: binarization of the warped display, see threshold_image
+    :param tracker: tracker of the session the image belongs to (see create_display_tracker),
+        the display is then searched around its last position first
+    """
+    if tracker is None:
+        box = find_display_box_freestyle_libre(image, factor)
+    else:
+        box = tracker.locate(image, factor=factor)
+
+    if box is None:
+        return []
+
+    lcd_display = perspective_transformation(image, box, display_size)
+    lcd_display = threshold_image(lcd_display, threshold_strategy)
     e = lcd_display
     return [e]
 
 
-def detect_digits_freestyle_libre(image: np.ndarray) -> Tuple[Optional[str], Dict]:
-    lcd_displays = detect_display_freestyle_libre(image)
+def create_display_tracker() -> DisplayTracker:
+    """
+    :return: tracker for detect_display_freestyle_libre, the search factor is given by each detect call
+    """
+    return DisplayTracker(find_display_box_freestyle_libre)
+
+
+def detect_digits_freestyle_libre(image: np.ndarray, canonical_display: bool = False,
+                                  use_segmentation: bool = False, thread_count: int = 1,
+                                  threshold_strategy: Optional[str] = None,
+                                  tracker: Optional[DisplayTracker] = None,
+                                  display_factor: Optional[float] = 2,
+                                  channel: Optional[str] = None,
+                                  stage_timer: Optional[StageTimer] = None,
+                                  lcd_displays: Optional[List[np.ndarray]] = None) -> Tuple[Optional[str], Dict]:
+    """
+    :param canonical_display: warp the display to CANONICAL_DISPLAY_SIZE and match only the canonical scales
+    :param use_segmentation: classify connected components of the display first (detect_hypothesis_segmented),
+        the template sweep is used only when less than MIN_SEGMENTED_DIGITS digits are found
+    :param thread_count: number of threads of digit and arrow template matching
+    :param threshold_strategy: binarization of the warped display, see threshold_image
+    :param tracker: display tracker of the session the image belongs to
+    :param display_factor: downscale factor of the display search, None adapts it to the image resolution
+    :param channel: CHANNEL_GRAY or CHANNEL_VALUE - only this channel is extracted from the image and used
+        for the display search, warp and threshold (mean shift thresholding is not available then)
+    :param stage_timer: records durations of the recognition stages, STAGE_TIMER by default,
+        durations of the call are also returned in the metadata as "stage_durations"
+    :param lcd_displays: displays found by detect_digits_display_freestyle_libre with the same parameters,
+        the display detection is skipped then
+    """
+    if stage_timer is None:
+        stage_timer = STAGE_TIMER
+
+    stage_timer.start_call()
+    if lcd_displays is None:
+        lcd_displays = _detect_digits_display(image, canonical_display, threshold_strategy, tracker, display_factor,
+                                              channel, stage_timer)
+
+    annotation, metadata = _read_display_freestyle_libre(lcd_displays, canonical_display, use_segmentation,
+                                                         thread_count, stage_timer)
+    metadata["stage_durations"] = dict(stage_timer.durations)
+    return annotation, metadata
+
+
+def detect_digits_display_freestyle_libre(image: np.ndarray, canonical_display: bool = False,
+                                          threshold_strategy: Optional[str] = None,
+                                          tracker: Optional[DisplayTracker] = None,
+                                          display_factor: Optional[float] = 2,
+                                          channel: Optional[str] = None,
+                                          **digit_detection_parameters) -> List[np.ndarray]:
+    """
+    The display detection step of detect_digits_freestyle_libre, it takes the same parameters.
+
+    :param digit_detection_parameters: parameters of the later steps, they are ignored
+    :return: the thresholded display or an empty list, can be passed to detect_digits_freestyle_libre as lcd_displays
+    """
+    return _detect_digits_display(image, canonical_display, threshold_strategy, tracker, display_factor, channel,
+                                  StageTimer())
+
+
+def _detect_digits_display(image: np.ndarray, canonical_display: bool, threshold_strategy: Optional[str],
+                           tracker: Optional[DisplayTracker], display_factor: Optional[float],
+                           channel: Optional[str], stage_timer: StageTimer) -> List[np.ndarray]:
+    if channel is not None:
+        with stage_timer.stage("channel_extraction"):
+            image = extract_channel(image, channel)
+
+    display_size = CANONICAL_DISPLAY_SIZE if canonical_display else None
+    with stage_timer.stage("display_detection"):
+        return detect_display_freestyle_libre(image, display_factor, display_size=display_size,
+                                              threshold_strategy=threshold_strategy, tracker=tracker)
+
 
+def _read_display_freestyle_libre(lcd_displays: List[np.ndarray], canonical_display: bool, use_segmentation: bool,
+                                  thread_count: int, stage_timer: StageTimer) -> Tuple[Optional[str], Dict]:
+    digit_scales = CANONICAL_DIGIT_SCALES if canonical_display else {}
     if len(lcd_displays) == 0:
         return None, {"display_detected": False}
 
     lcd_display = lcd_displays[0]
-    rectangles = detect_hypothesis(lcd_display)
+    rectangles = []
+    with stage_timer.stage("digit_detection"):
+        if use_segmentation:
+            rectangles = detect_hypothesis_segmented(lcd_display)
+
+        if len(rectangles) < MIN_SEGMENTED_DIGITS:
+            rectangles = detect_hypothesis(lcd_display, thread_count=thread_count, **digit_scales)
+
     if len(rectangles) == 0:
         return None, {"display_detected": True, "annotated_image": lcd_display}
 
-    rectangles = get_leading_rectangles(rectangles)
+    with stage_timer.stage("leading_rectangles"):
+        rectangles = get_leading_rectangles_vectorized(rectangles)
+
     if len(rectangles) == 0:
         return None, {"display_detected": True, "annotated_image": lcd_display}
 
@@ -162,7 +396,9 @@ def detect_digits_freestyle_libre(image: np.ndarray) -> Tuple[Optional[str], Dic
     x_right = lcd_display.shape[1]
     arrow_window = lcd_display[y0:y1, x1:x_right]
 
-    arrow_type = detect_arrow(arrow_window)
+    with stage_timer.stage("arrow_detection"):
+        arrow_type = detect_arrow(arrow_window, digit_width=x1 - x0, early_stop_threshold=ARROW_EARLY_STOP_THRESHOLD,
+                                  thread_count=thread_count, **ARROW_DIGIT_SCALES)
     arrow_description = describe_arrow[arrow_type]
 
     annotation = annotation + " " + arrow_description
@@ -190,7 +426,7 @@ if __name__ == "__main__":
 
         for lcd_display in lcd_displays:
             rectangles = detect_hypothesis(lcd_display)
-            rectangles = get_leading_rectangles(rectangles)
+            rectangles = get_leading_rectangles_vectorized(rectangles)
 
             if len(rectangles) == 0:
                 continue
@@ -1,11 +1,15 @@
-from typing import Dict, Callable, Tuple
+import time
+from functools import partial
+from typing import Dict, Callable, List, Tuple
 
 import cv2
 import numpy as np
 from tqdm import tqdm
 
 from recognize_seven_segment.detectors.detect_digits import detect_digits
+from recognize_seven_segment.experiments.detect_digits_freestyle_libre import detect_digits_freestyle_libre
 from recognize_seven_segment.utils.input_output import list_image_paths, load_image
+from recognize_seven_segment.utils.threshold import THRESHOLD_STRATEGIES
 
 
 def get_label(image_path: str) -> str:
@@ -20,12 +24,15 @@ def evaluate(image_dir: str, predict_function: Callable[[np.ndarray], Tuple[str,
 
     correctly_classified_count = 0
     classified_count = 0
+    duration = 0.0
 
     for image_path in tqdm(image_paths):
         image = load_image(image_path)
         label = get_label(image_path)
 
+        start = time.perf_counter()
         predicted_label, metadata = predict_function(image)
+        duration += time.perf_counter() - start
 
         if predicted_label is not None:
             classified_count += 1
@@ -38,7 +45,29 @@ def evaluate(image_dir: str, predict_function: Callable[[np.ndarray], Tuple[str,
 
     return {"certain_and_correct": correctly_classified_count,
             "total_certain": classified_count,
-            "total": len(image_paths)}
+            "total": len(image_paths),
+            "mean_duration": duration / max(1, len(image_paths))}
+
+
+def compare_threshold_strategies(image_dir: str, strategies: List[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Evaluates the FreeStyle Libre pipeline with every display threshold strategy and prints
+    a speed/accuracy table, use it to choose GLUCOSCAN_THRESHOLD_STRATEGY of a deployment.
+    """
+    if strategies is None:
+        strategies = THRESHOLD_STRATEGIES
+
+    evaluations = {}
+    for strategy in strategies:
+        evaluations[strategy] = evaluate(image_dir, partial(detect_digits_freestyle_libre,
+                                                            threshold_strategy=strategy))
+
+    print(f"{'strategy':<12}{'correct':>10}{'certain':>10}{'total':>8}{'ms/image':>10}")
+    for strategy, evaluation in evaluations.items():
+        print(f"{strategy:<12}{evaluation['certain_and_correct']:>10}{evaluation['total_certain']:>10}"
+              f"{evaluation['total']:>8}{1000 * evaluation['mean_duration']:>10.1f}")
+
+    return evaluations
 
 
 def main():
@@ -0,0 +1,171 @@
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from recognize_seven_segment.detectors.detect_digits import detect_digits, detect_display_easy_gluko
+from recognize_seven_segment.experiments.detect_digits_freestyle_libre import detect_digits_freestyle_libre, \
+    create_display_tracker, detect_digits_display_freestyle_libre
+from recognize_seven_segment.utils.display_tracker import DisplayTracker
+from recognize_seven_segment.utils.generate_digit import easy_gluko_template_bank, freestyle_libre_template_bank
+from recognize_seven_segment.utils.segment_digits import find_digit_blobs, classify_blobs, get_ink_height_ratio
+from recognize_seven_segment.utils.template_bank import TemplateBank
+from recognize_seven_segment.utils.threshold import threshold_colored
+
+PROBE_FRAMES = 3  # frames of a session probed by all profiles before the session sticks to one of them
+PROBE_MATCH_THRESHOLD = 0.7  # match coefficient of a digit blob counted by the probe
+
+
+class DeviceProfile(object):
+    """
+    Everything needed to read one glucometer model.
+    """
+
+    def __init__(self, name: str, detect_digits_function: Callable[..., Tuple[Optional[str], Dict]],
+                 detect_display_function: Callable[..., List[np.ndarray]],
+                 template_bank: TemplateBank, parameters: Optional[Dict] = None,
+                 create_tracker: Optional[Callable[[], DisplayTracker]] = None,
+                 threshold_display_function: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """
+        :param detect_digits_function: function (image, lcd_displays=None, **parameters) -> (annotation, metadata),
+            it has to accept a tracker keyword argument when create_tracker is given
+        :param detect_display_function: the display detection step of detect_digits_function,
+            function (image, **parameters) -> list of displays, which can be passed to it as lcd_displays
+        :param template_bank: font of the device, its digit glyphs are used by the probe
+        :param create_tracker: factory of display trackers of the device sessions
+        :param threshold_display_function: binarizes a display for the probe (dark glyphs on light background),
+            by default the displays are already binary
+        """
+        self.name = name
+        self.detect_digits_function = detect_digits_function
+        self.detect_display_function = detect_display_function
+        self.template_bank = template_bank
+        self.parameters = parameters if parameters is not None else {}
+        self.create_tracker = create_tracker
+        self.threshold_display_function = threshold_display_function
+
+        self._digit_glyphs = [glyph for glyph in template_bank.glyph_names if str(glyph).isdigit()]
+        self._ink_height_ratios = [get_ink_height_ratio(template_bank.get(glyph)) for glyph in self._digit_glyphs]
+
+    def recognize(self, image: np.ndarray, tracker: Optional[DisplayTracker] = None,
+                  lcd_displays: Optional[List[np.ndarray]] = None) -> Tuple[Optional[str], Dict]:
+        """
+        :param lcd_displays: displays of the image found by probe, they are read without detecting them again
+        """
+        parameters = self._get_parameters(tracker)
+        if lcd_displays is not None:
+            parameters["lcd_displays"] = lcd_displays
+
+        return self.detect_digits_function(image, **parameters)
+
+    def probe(self, image: np.ndarray, tracker: Optional[DisplayTracker] = None) -> Tuple[int, List[np.ndarray]]:
+        """
+        Lightweight check whether the image shows this device - the display is segmented into digit blobs
+        and every blob is matched once by the digit glyphs of the device font, no template sweep is run.
+
+        :return: number of blobs matching a digit of the device and the detected displays (see recognize)
+        """
+        lcd_displays = self.detect_display_function(image, **self._get_parameters(tracker))
+        if len(lcd_displays) == 0:
+            return 0, lcd_displays
+
+        lcd_display = lcd_displays[0]
+        if self.threshold_display_function is not None:
+            lcd_display = self.threshold_display_function(lcd_display)
+
+        blobs = find_digit_blobs(lcd_display)
+        digit_count = len(classify_blobs(lcd_display, blobs, self.template_bank.get, self._digit_glyphs,
+                                         self._ink_height_ratios, PROBE_MATCH_THRESHOLD))
+        return digit_count, lcd_displays
+
+    def _get_parameters(self, tracker: Optional[DisplayTracker]) -> Dict:
+        parameters = dict(self.parameters)
+        if tracker is not None:
+            parameters["tracker"] = tracker
+
+        return parameters
+
+
+DEVICE_PROFILES: Dict[str, DeviceProfile] = {}
+
+
+def register_device_profile(profile: DeviceProfile):
+    if profile.name in DEVICE_PROFILES:
+        raise AssertionError(f"Device profile {profile.name} is already registered")
+
+    DEVICE_PROFILES[profile.name] = profile
+
+
+register_device_profile(DeviceProfile("freestyle_libre", detect_digits_freestyle_libre,
+                                      detect_digits_display_freestyle_libre, freestyle_libre_template_bank,
+                                      create_tracker=create_display_tracker))
+register_device_profile(DeviceProfile("easy_gluko", detect_digits, detect_display_easy_gluko,
+                                      easy_gluko_template_bank, threshold_display_function=threshold_colored))
+
+
+class DeviceProfileRouter(object):
+    """
+    Picks the device profile of a session (camera stream).
+
+    The first probe_frames frames are probed by all profiles (see DeviceProfile.probe) and read only
+    by the profile leading the probes so far, from the displays its probe found. Then the session sticks
+    to the leading profile
+    (the earlier registered one on a tie, i.e. the first one when no probe found any digit).
+    """
+
+    def __init__(self, profiles: Optional[List[DeviceProfile]] = None, probe_frames: int = PROBE_FRAMES):
+        if profiles is None:
+            profiles = list(DEVICE_PROFILES.values())
+
+        if len(profiles) == 0:
+            raise AssertionError("At least one device profile is needed")
+
+        self._profiles = profiles
+        self._probe_frames = probe_frames
+        self._trackers = {profile.name: profile.create_tracker() for profile in profiles
+                          if profile.create_tracker is not None}
+        self._probe_scores = Counter()
+        self._probed_frames = 0
+
+        self.profile = None
+        self._settle_single_profile()
+
+    def recognize(self, image: np.ndarray) -> Tuple[Optional[str], Dict]:
+        if self.profile is not None:
+            return self._recognize(self.profile, image)
+
+        probed_displays = {}
+        for profile in self._profiles:
+            score, probed_displays[profile.name] = profile.probe(image, self._trackers.get(profile.name))
+            self._probe_scores[profile.name] += score
+
+        self._probed_frames += 1
+        leading_profile = self._leading_profile()
+        if self._probed_frames >= self._probe_frames:
+            self.profile = leading_profile
+
+        return self._recognize(leading_profile, image, probed_displays[leading_profile.name])
+
+    def reset(self):
+        self._probe_scores.clear()
+        self._probed_frames = 0
+        self._settle_single_profile()
+        for tracker in self._trackers.values():
+            tracker.reset()
+
+    def _settle_single_profile(self):
+        self.profile = self._profiles[0] if len(self._profiles) == 1 or self._probe_frames <= 0 else None
+
+    def _leading_profile(self) -> DeviceProfile:
+        return max(self._profiles, key=lambda profile: self._probe_scores[profile.name])  # max keeps the first one
+
+    def _recognize(self, profile: DeviceProfile, image: np.ndarray,
+                   lcd_displays: Optional[List[np.ndarray]] = None) -> Tuple[Optional[str], Dict]:
+        tracker = self._trackers.get(profile.name)
+        annotation, metadata = profile.recognize(image, tracker, lcd_displays)
+
+        metadata["device_profile"] = profile.name
+        if tracker is not None:
+            metadata["display_tracking"] = tracker.statistics()
+
+        return annotation, metadata
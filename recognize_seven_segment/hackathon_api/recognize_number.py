@@ -1,15 +1,65 @@
 import base64
-from typing import Dict, Optional, Tuple
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
-from recognize_seven_segment.experiments.detect_digits_freestyle_libre import detect_digits_freestyle_libre
+from recognize_seven_segment.hackathon_api.device_profiles import DEVICE_PROFILES, DeviceProfile, \
+    DeviceProfileRouter
 
+MAX_TRACKED_SESSIONS = 64  # least recently seen sessions are forgotten
 
-def recognize_number(image: np.ndarray) -> Tuple[Optional[str], Dict]:
-    # annotation, metadata = detect_digits(image)
-    annotation, metadata = detect_digits_freestyle_libre(image)
+
+def parse_device_profile_names(value: str) -> List[str]:
+    """
+    :param value: comma separated names of registered device profiles
+    """
+    names = [name.strip() for name in value.split(",")]
+    for name in names:
+        if name not in DEVICE_PROFILES:
+            raise AssertionError(f"Unknown device profile {name}, known profiles: {', '.join(DEVICE_PROFILES)}")
+
+    return names
+
+
+# comma separated device profiles of the deployment, e.g. GLUCOSCAN_DEVICE_PROFILES=easy_gluko
+# (the first one reads images without a session), validated at import so a typo fails the start
+DEVICE_PROFILE_NAMES = parse_device_profile_names(os.environ.get("GLUCOSCAN_DEVICE_PROFILES",
+                                                                 ",".join(DEVICE_PROFILES)))
+
+_session_routers: OrderedDict = OrderedDict()
+
+
+def get_device_profiles() -> List[DeviceProfile]:
+    return [DEVICE_PROFILES[name] for name in DEVICE_PROFILE_NAMES]
+
+
+def get_session_router(sid: Hashable) -> DeviceProfileRouter:
+    router = _session_routers.get(sid)
+    if router is None:
+        router = DeviceProfileRouter(get_device_profiles())
+        _session_routers[sid] = router
+        if len(_session_routers) > MAX_TRACKED_SESSIONS:
+            _session_routers.popitem(last=False)
+    else:
+        _session_routers.move_to_end(sid)
+
+    return router
+
+
+def recognize_number(image: np.ndarray, sid: Optional[Hashable] = None) -> Tuple[Optional[str], Dict]:
+    """
+    :param sid: session (camera stream) the image belongs to, its device profile is picked from its first images
+        and its display is tracked between the images
+    """
+    if sid is None:
+        profile = get_device_profiles()[0]
+        annotation, metadata = profile.recognize(image)
+        metadata["device_profile"] = profile.name
+    else:
+        annotation, metadata = get_session_router(sid).recognize(image)
 
     if "annotated_image" in metadata:
         annotated_image = metadata["annotated_image"]
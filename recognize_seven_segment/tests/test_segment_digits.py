@@ -0,0 +1,68 @@
+import cv2
+import imutils
+import numpy as np
+
+from recognize_seven_segment.experiments.detect_digits_freestyle_libre import detect_hypothesis_segmented, \
+    threshold_image
+from recognize_seven_segment.utils.generate_digit import freestyle_libre_digits
+from recognize_seven_segment.utils.perspective_transformation import perspective_transformation
+from recognize_seven_segment.utils.segment_digits import find_digit_blobs
+
+DISPLAY_ORIGIN = (120, 100)  # (x, y) of the display in the frame
+DISPLAY_SIZE = (420, 300)  # (width, height)
+
+
+def make_display(digits: str) -> np.ndarray:
+    display_width, display_height = DISPLAY_SIZE
+    display = np.full((display_height, display_width), 230, np.uint8)
+    digit_width = display_width // 6
+
+    x = 30
+    for digit in digits:
+        glyph = imutils.resize(freestyle_libre_digits[digit], width=digit_width)
+        display[60:60 + glyph.shape[0], x:x + digit_width] = glyph
+        x += digit_width + 8
+
+    return display
+
+
+def make_frame(display: np.ndarray, angle: float = 0) -> (np.ndarray, np.ndarray):
+    """
+    :return: (dark frame with the display, corners of the display box slightly outside of the display
+        as the display search finds them)
+    """
+    frame = np.random.RandomState(0).randint(0, 80, (480, 640, 3)).astype(np.uint8)
+    x, y = DISPLAY_ORIGIN
+    frame[y:y + display.shape[0], x:x + display.shape[1]] = cv2.cvtColor(display, cv2.COLOR_GRAY2BGR)
+
+    corners = np.array([[x - 2, y - 2], [x + display.shape[1] + 2, y - 2],
+                        [x + display.shape[1] + 2, y + display.shape[0] + 2], [x - 2, y + display.shape[0] + 2]],
+                       dtype=np.float64)
+
+    rotation = cv2.getRotationMatrix2D((320, 240), angle, 1.0)
+    frame = cv2.warpAffine(frame, rotation, (frame.shape[1], frame.shape[0]))
+    corners = np.hstack([corners, np.ones((4, 1))]) @ rotation.T
+    return frame, np.round(corners).astype(np.int32)
+
+
+def warp_display(digits: str, angle: float = 0) -> np.ndarray:
+    frame, corners = make_frame(make_display(digits), angle)
+    return threshold_image(perspective_transformation(frame, corners))
+
+
+def test_warped_display_border_is_not_a_blob():
+    display = warp_display("123")
+
+    assert (display[0] < 128).all()  # the warp leaves a dark border
+
+    blobs = find_digit_blobs(display)
+    assert len(blobs) == 3
+    assert all(x1 - x0 < display.shape[1] / 2 for x0, _, x1, _ in blobs)
+
+
+def test_segmented_digits_of_warped_display():
+    for digits, angle in [("123", 0), ("456", 3), ("789", -3), ("105", 0)]:
+        rectangles = detect_hypothesis_segmented(warp_display(digits, angle))
+
+        rectangles.sort(key=lambda rectangle: rectangle[0][0])
+        assert [str(digit) for _, _, digit in rectangles] == list(digits)
@@ -1,41 +1,221 @@
-from typing import List, Tuple
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
 
 import cv2
 import imutils
 import numpy as np
 
+from recognize_seven_segment.utils.non_maximum_suppression import find_response_peaks, \
+    suppress_overlapping_rectangles
 
-def adaptively_match_digit_hypotheses(template: np.ndarray, image: np.ndarray, scale_iterations: int = 10,
-                                      scale_min: float = 0.5, scale_max: float = 1.0,
-                                      match_threshold: float = 0.6) -> List[Tuple[List[int], float]]:
+NMS_PEAKS = "peaks"  # local maxima of every response map, then IoU suppression across scales
+NMS_IOU = "iou"  # IoU suppression of all thresholded hits
+
+MIN_COARSE_TEMPLATE_SIZE = 4  # smaller coarse templates are matched directly at full resolution
+
+_thread_pools: Dict[int, ThreadPoolExecutor] = {}  # shared by all calls, keyed by the thread count
+_thread_pools_lock = threading.Lock()
+
+
+def get_thread_pool(thread_count: int) -> ThreadPoolExecutor:
     """
-    :return: list of digit occurences ((x0, y0, x1, y1), confidence)
+    :return: matching thread pool of the given size, it is created on the first use and kept for the process
     """
-    image_height, image_width = image.shape
+    with _thread_pools_lock:
+        if thread_count not in _thread_pools:
+            _thread_pools[thread_count] = ThreadPoolExecutor(max_workers=thread_count,
+                                                             thread_name_prefix="template_matching")
 
-    template_height, template_width = template.shape
+        return _thread_pools[thread_count]
 
-    rectangles = []
 
+def build_scale_pyramid(image: np.ndarray, scale_iterations: int = 10,
+                        scale_min: float = 0.5, scale_max: float = 1.0) -> List[Tuple[np.ndarray, float]]:
+    """
+    Resizes the image once per scale (largest scale first).
+
+    :return: list of (resized image, inverse scale) pairs
+    """
+    image_height, image_width = image.shape[:2]
+
+    pyramid = []
     for scale in np.linspace(scale_min, scale_max, scale_iterations)[::-1]:
         resized = imutils.resize(image, width=int(image_width * scale))
-        resized_height, resized_width = resized.shape
+        resized_width = resized.shape[1]
         scale_inv = image_width / float(resized_width)
+        pyramid.append((resized, scale_inv))
+
+    return pyramid
+
+
+def downscale(image: np.ndarray, factor: float) -> np.ndarray:
+    height, width = image.shape[:2]
+    size = (max(1, int(round(width * factor))), max(1, int(round(height * factor))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def adaptively_match_templates(templates: Dict[Hashable, np.ndarray], image: np.ndarray,
+                               scale_iterations: int = 10, scale_min: float = 0.5, scale_max: float = 1.0,
+                               match_threshold: float = 0.6,
+                               non_maximum_suppression: Optional[str] = None,
+                               nms_iou_threshold: float = 0.3,
+                               coarse_factor: Optional[float] = None,
+                               coarse_threshold_offset: float = 0.2,
+                               thread_count: int = 1) -> Dict[Hashable, List[Tuple[List[int], float]]]:
+    """
+    Matches all templates against a single scale pyramid of the image,
+    so the image is resized only once per scale regardless of the template count.
+
+    :param non_maximum_suppression: None (every hit above the threshold is returned), NMS_PEAKS or NMS_IOU.
+        Suppression is done per template, hits of different templates never suppress each other.
+    :param coarse_factor: enables coarse-to-fine matching - every level is first matched downscaled
+        by this factor (e.g. 0.25) with threshold lowered by coarse_threshold_offset, full resolution
+        matching then runs only inside regions around the coarse hits (levels without hits are skipped)
+    :param thread_count: number of threads matching (scale, template) pairs in parallel, the threads come
+        from a pool shared by all calls (see get_thread_pool), the result does not depend on it
+    :return: dictionary template key -> list of occurences ((x0, y0, x1, y1), confidence),
+        for every key the occurences are ordered in the same way as by adaptively_match_digit_hypotheses
+    """
+    if non_maximum_suppression not in [None, NMS_PEAKS, NMS_IOU]:
+        raise AssertionError(f"Unknown non maximum suppression: {non_maximum_suppression}")
+
+    if coarse_factor is not None and not 0 < coarse_factor < 1:
+        raise AssertionError("coarse_factor has to be in (0, 1)")
+
+    if thread_count < 1:
+        raise AssertionError("thread_count has to be positive")
+
+    coarse_templates = {}
+    if coarse_factor is not None:
+        coarse_templates = {key: downscale(template, coarse_factor) for key, template in templates.items()}
+
+    levels = []
+    for resized, scale_inv in build_scale_pyramid(image, scale_iterations, scale_min, scale_max):
+        coarse_resized = None
+        if coarse_factor is not None:
+            coarse_resized = downscale(resized, coarse_factor)
+
+        levels.append((resized, scale_inv, coarse_resized))
+
+    def match_level(level, key):
+        resized, scale_inv, coarse_resized = level
+        template = templates[key]
+        template_height, template_width = template.shape
+
+        coarse_template = coarse_templates.get(key)
+        if coarse_template is not None and min(coarse_template.shape) >= MIN_COARSE_TEMPLATE_SIZE \
+                and coarse_resized.shape[0] >= coarse_template.shape[0] \
+                and coarse_resized.shape[1] >= coarse_template.shape[1]:
+            ys, xs, values = _match_coarse_to_fine(resized, template, coarse_resized, coarse_template,
+                                                   match_threshold, match_threshold - coarse_threshold_offset,
+                                                   non_maximum_suppression)
+        else:
+            ys, xs, values = _match(resized, template, match_threshold, non_maximum_suppression)
 
-        if resized_width < template_width or resized_height < template_height:
-            break
+        return [(get_rectangle_coordinates(x, y, scale_inv, template_width, template_height), confidence)
+                for y, x, confidence in zip(ys, xs, values)]
 
-        result = cv2.matchTemplate(resized, template, cv2.TM_CCOEFF_NORMED)
-        start_coordinates = np.where(result > match_threshold)
-        values = result[start_coordinates]
-        for y, x, confidence in zip(*start_coordinates, values):
-            rectangle_coordinates = get_rectangle_coordinates(x, y, scale_inv, template_width, template_height)
-            rectangle = (rectangle_coordinates, confidence)
-            rectangles.append(rectangle)
+    tasks = []
+    for level in levels:
+        resized_height, resized_width = level[0].shape
+        for key, template in templates.items():
+            template_height, template_width = template.shape
+            if resized_width < template_width or resized_height < template_height:
+                continue  # the pyramid is descending, so the template won't fit any further level
+
+            tasks.append((level, key))
+
+    if thread_count > 1 and len(tasks) > 1:
+        # cv2 releases the GIL, results are merged in the task order, so they don't depend on the scheduling
+        task_rectangles = list(get_thread_pool(thread_count).map(lambda task: match_level(*task), tasks))
+    else:
+        task_rectangles = [match_level(level, key) for level, key in tasks]
+
+    rectangles = {key: [] for key in templates}
+    for (_, key), occurences in zip(tasks, task_rectangles):
+        rectangles[key].extend(occurences)
+
+    if non_maximum_suppression is not None:
+        for key in rectangles:
+            rectangles[key] = suppress_overlapping_rectangles(rectangles[key], nms_iou_threshold)
 
     return rectangles
 
 
+def _match(image: np.ndarray, template: np.ndarray, match_threshold: float,
+           non_maximum_suppression: Optional[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: (ys, xs, confidences) of template occurences in the image, ordered like np.where
+    """
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+
+    if non_maximum_suppression == NMS_PEAKS:
+        neighbourhood_size = min(template.shape) // 2
+        ys, xs = find_response_peaks(result, match_threshold, neighbourhood_size)
+    else:
+        ys, xs = np.where(result > match_threshold)
+
+    return ys, xs, result[ys, xs]
+
+
+def _match_coarse_to_fine(image: np.ndarray, template: np.ndarray,
+                          coarse_image: np.ndarray, coarse_template: np.ndarray,
+                          match_threshold: float, coarse_match_threshold: float,
+                          non_maximum_suppression: Optional[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds candidate regions on the coarse image and matches the template at full resolution only inside them.
+
+    :return: (ys, xs, confidences) of template occurences in the image, ordered like np.where
+    """
+    coarse_result = cv2.matchTemplate(coarse_image, coarse_template, cv2.TM_CCOEFF_NORMED)
+    candidates = (coarse_result > coarse_match_threshold).astype(np.uint8)
+    if not candidates.any():
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+    image_height, image_width = image.shape
+    template_height, template_width = template.shape
+    factor_x = image_width / float(coarse_image.shape[1])
+    factor_y = image_height / float(coarse_image.shape[0])
+    margin_x = int(math.ceil(factor_x)) + 2  # covers the coarse grid quantization
+    margin_y = int(math.ceil(factor_y)) + 2
+
+    occurences = {}
+    _, _, stats, _ = cv2.connectedComponentsWithStats(candidates)
+    for x, y, width, height, _ in stats[1:]:
+        x0 = max(0, int(x * factor_x) - margin_x)
+        y0 = max(0, int(y * factor_y) - margin_y)
+        x1 = min(image_width, int((x + width) * factor_x) + margin_x + template_width)
+        y1 = min(image_height, int((y + height) * factor_y) + margin_y + template_height)
+        if x1 - x0 < template_width or y1 - y0 < template_height:
+            continue
+
+        ys, xs, values = _match(image[y0:y1, x0:x1], template, match_threshold, non_maximum_suppression)
+        for y, x, confidence in zip(ys, xs, values):
+            occurences[(y + y0, x + x0)] = confidence  # regions can overlap
+
+    coordinates = sorted(occurences)
+    ys = np.array([y for y, _ in coordinates], dtype=np.int64)
+    xs = np.array([x for _, x in coordinates], dtype=np.int64)
+    values = np.array([occurences[coordinate] for coordinate in coordinates], dtype=np.float32)
+    return ys, xs, values
+
+
+def adaptively_match_digit_hypotheses(template: np.ndarray, image: np.ndarray, scale_iterations: int = 10,
+                                      scale_min: float = 0.5, scale_max: float = 1.0,
+                                      match_threshold: float = 0.6,
+                                      non_maximum_suppression: Optional[str] = None,
+                                      coarse_factor: Optional[float] = None,
+                                      thread_count: int = 1) -> List[Tuple[List[int], float]]:
+    """
+    :return: list of digit occurences ((x0, y0, x1, y1), confidence)
+    """
+    return adaptively_match_templates({0: template}, image, scale_iterations, scale_min, scale_max,
+                                      match_threshold, non_maximum_suppression,
+                                      coarse_factor=coarse_factor, thread_count=thread_count)[0]
+
+
 def get_rectangle_coordinates(x: int, y: int, scale_inv: int, template_width: int, template_height: int) -> List[int]:
     x0 = (int)(x * scale_inv)
     y0 = (int)(y * scale_inv)
@@ -0,0 +1,97 @@
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+from recognize_seven_segment.utils.non_maximum_suppression import intersection_over_union
+
+
+class DisplayTracker(object):
+    """
+    Remembers the display box of the last frame of a session (camera stream).
+
+    The display barely moves between frames, so it is first searched only in a window around
+    the last box. The box found there is accepted when it overlaps the last one enough,
+    otherwise the whole frame is searched.
+    """
+
+    def __init__(self, find_display_box: Callable[..., Optional[np.ndarray]],
+                 search_margin: float = 0.1, min_iou: float = 0.6):
+        """
+        :param find_display_box: function (image, **search_parameters) -> array of 4 (x, y) display corners or None
+        :param search_margin: margin of the search window as a part of the larger side of the last box
+        :param min_iou: minimal IoU of bounding rectangles of the last and the new box
+        """
+        if search_margin < 0:
+            raise AssertionError("search_margin can't be negative")
+
+        self._find_display_box = find_display_box
+        self._search_margin = search_margin
+        self._min_iou = min_iou
+        self.box = None
+
+        self.hits = 0  # displays found in the search window
+        self.misses = 0  # search window failures (the whole frame was searched)
+        self.full_searches = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+
+        return self.hits / total
+
+    def locate(self, image: np.ndarray, **search_parameters) -> Optional[np.ndarray]:
+        """
+        :param search_parameters: passed to find_display_box both for the window and the whole frame search
+        :return: array of 4 (x, y) display corners or None when there is no display in the image
+        """
+        if self.box is not None:
+            box = self._search_window(image, search_parameters)
+            if box is not None:
+                self.hits += 1
+                self.box = box
+                return box
+
+            self.misses += 1
+
+        self.full_searches += 1
+        self.box = self._find_display_box(image, **search_parameters)
+        return self.box
+
+    def reset(self):
+        self.box = None
+
+    def statistics(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate,
+                "full_searches": self.full_searches}
+
+    def _search_window(self, image: np.ndarray, search_parameters: Dict) -> Optional[np.ndarray]:
+        image_height, image_width = image.shape[:2]
+        x, y, width, height = cv2.boundingRect(self.box)
+        margin = int(self._search_margin * max(width, height))
+
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        x1, y1 = min(image_width, x + width + margin), min(image_height, y + height + margin)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        box = self._find_display_box(image[y0:y1, x0:x1], **search_parameters)
+        if box is None:
+            return None
+
+        box = box + np.array([x0, y0], dtype=box.dtype)
+        if intersection_over_union(_bounding_corners(self.box), _bounding_corners(box)[np.newaxis])[0] \
+                < self._min_iou:
+            return None
+
+        return box
+
+
+def _bounding_corners(box: np.ndarray) -> np.ndarray:
+    """
+    :return: array (x0, y0, x1, y1) of the upright bounding rectangle of the box
+    """
+    x, y, width, height = cv2.boundingRect(box)
+    return np.array([x, y, x + width, y + height], dtype=np.float64)
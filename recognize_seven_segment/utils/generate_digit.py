@@ -5,6 +5,8 @@ import imutils
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from recognize_seven_segment.utils.template_bank import TemplateBank
+
 this_file_path = os.path.realpath(__file__)
 
 
@@ -36,12 +38,20 @@ def load_digit_easy_gluko(digit: int) -> np.ndarray:
 
 
 easy_gluko_digits = [load_digit_easy_gluko(digit) for digit in range(10)]
+easy_gluko_template_bank = TemplateBank(dict(enumerate(easy_gluko_digits)))
 
 
 def generate_digit_easy_gluko(digit: int, width: int = 40) -> np.ndarray:
     return imutils.resize(easy_gluko_digits[digit], width=width)
 
 
+def get_digit_template_easy_gluko(digit: int, width: int = 40) -> np.ndarray:
+    """
+    Cached (read-only) variant of generate_digit_easy_gluko, width is bucketed by the template bank.
+    """
+    return easy_gluko_template_bank.get(int(digit), width)
+
+
 def load_digit_freestyle_libre(digit: str) -> np.ndarray:
     relative_path = os.path.join("..", "resources", "fonts", "FreeStyleLibreFont", str(digit) + ".png")
     image_path = os.path.join(os.path.dirname(this_file_path), relative_path)
@@ -54,12 +64,20 @@ def load_digit_freestyle_libre(digit: str) -> np.ndarray:
 freestyle_libre_digits = {str(digit): load_digit_freestyle_libre(str(digit) + "_small")
                           for digit in list(range(10)) +
                           ["up", "down", "down_right", "up_right", "right"]}
+freestyle_libre_template_bank = TemplateBank(freestyle_libre_digits)
 
 
 def generate_digit_freestyle_libre(digit: str, width: int = 40) -> np.ndarray:
     return imutils.resize(freestyle_libre_digits[str(digit)], width=width)
 
 
+def get_digit_template_freestyle_libre(digit: str, width: int = 40) -> np.ndarray:
+    """
+    Cached (read-only) variant of generate_digit_freestyle_libre, width is bucketed by the template bank.
+    """
+    return freestyle_libre_template_bank.get(str(digit), width)
+
+
 if __name__ == "__main__":
     import matplotlib.pyplot as plt
 
@@ -1,5 +1,7 @@
 from typing import List, Tuple
 
+import numpy as np
+
 
 def rectangles_could_be_adjacent_digits(rectangle_a: Tuple[List[int], float, int],
                                         rectangle_b: Tuple[List[int], float, int],
@@ -70,3 +72,95 @@ def get_leading_rectangles(rectangles: List[Tuple[List[int], float, int]]) \
         return best_pair + best_rectangle_rightmost
     else:
         return best_rectangle_leftmost + best_pair
+
+
+def _adjacency_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray,
+                      max_allowed_size_ratio: float = 1.4,
+                      min_allowed_horizontal_distance_multiple: float = 1.0,
+                      max_allowed_horizontal_distance_multiple: float = 0.4,
+                      max_allowed_vertical_distance_multiple: float = 0.3) -> np.ndarray:
+    """
+    Broadcasted rectangles_could_be_adjacent_digits.
+
+    :param boxes_a: array of shape (n, 4) with (x0, y0, x1, y1) rows
+    :param boxes_b: array of shape (m, 4) with (x0, y0, x1, y1) rows
+    :return: bool array of shape (n, m)
+    """
+    x0_a, y0_a, x1_a, y1_a = [boxes_a[:, [i]] for i in range(4)]
+    x0_b, y0_b, x1_b, y1_b = [boxes_b[None, :, i] for i in range(4)]
+    width_a, width_b = x1_a - x0_a, x1_b - x0_b
+    height_a, height_b = y1_a - y0_a, y1_b - y0_b
+
+    average_width = (width_a + width_b) / 2
+    average_height = (height_a + height_b) / 2
+
+    return (width_a / width_b < max_allowed_size_ratio) & \
+           (width_b / width_a < max_allowed_size_ratio) & \
+           (height_a / height_b < max_allowed_size_ratio) & \
+           (height_b / height_a < max_allowed_size_ratio) & \
+           (np.abs(x0_a - x0_b) > average_width * min_allowed_horizontal_distance_multiple) & \
+           (np.minimum(np.abs(x1_a - x0_b), np.abs(x1_b - x0_a)) <
+            average_width * max_allowed_horizontal_distance_multiple) & \
+           (np.abs(y0_a - y0_b) < average_height * max_allowed_vertical_distance_multiple)
+
+
+def _first_best(coeffs: np.ndarray, mask: np.ndarray, lower_bound: float = -1) -> Tuple[int, float]:
+    """
+    :return: (index, coeff) of the first maximal coeff selected by mask which is above lower_bound,
+        index is -1 when there is no such coeff
+    """
+    candidates = np.flatnonzero(mask)
+    if len(candidates) == 0:
+        return -1, lower_bound
+
+    best = candidates[np.argmax(coeffs[candidates])]
+    if not coeffs[best] > lower_bound:
+        return -1, lower_bound
+
+    return best, coeffs[best]
+
+
+def get_leading_rectangles_vectorized(rectangles: List[Tuple[List[int], float, int]], chunk_size: int = 256) \
+        -> List[Tuple[List[int], float, int]]:
+    """
+    NumPy implementation of get_leading_rectangles, returns exactly the same rectangles
+    (including the tie breaking). Pairs are evaluated in blocks of chunk_size rows to bound memory.
+    """
+    if len(rectangles) == 0:
+        return []
+
+    boxes = np.array([rectangle[0] for rectangle in rectangles], dtype=np.float64)
+    coeffs = np.array([rectangle[1] for rectangle in rectangles])
+
+    best_pair_coeff = -1
+    best_pair = None
+    for chunk_start in range(0, len(rectangles), chunk_size):
+        chunk_boxes = boxes[chunk_start:chunk_start + chunk_size]
+        is_pair = _adjacency_matrix(chunk_boxes, boxes) & (chunk_boxes[:, [0]] < boxes[None, :, 0])
+        cumulative_coeffs = coeffs[chunk_start:chunk_start + chunk_size, None] + coeffs[None, :]
+
+        pair_index, pair_coeff = _first_best(cumulative_coeffs.ravel(), is_pair.ravel(), best_pair_coeff)
+        if pair_index >= 0:
+            best_pair_coeff = pair_coeff
+            best_pair = (chunk_start + pair_index // len(rectangles), pair_index % len(rectangles))
+
+    if best_pair is None:
+        return []
+
+    left_index, right_index = best_pair
+    adjacent_to_pair = _adjacency_matrix(boxes, boxes[[left_index, right_index]])
+
+    leftmost_index, best_coeff_leftmost = _first_best(
+        coeffs, (boxes[:, 0] < boxes[left_index, 0]) & adjacent_to_pair[:, 0])
+    rightmost_index, best_coeff_rightmost = _first_best(
+        coeffs, (boxes[:, 2] > boxes[right_index, 2]) & adjacent_to_pair[:, 1])
+
+    best_pair = [rectangles[left_index], rectangles[right_index]]
+    best_rectangle_leftmost = [rectangles[leftmost_index]] if leftmost_index >= 0 else []
+    best_rectangle_rightmost = [rectangles[rightmost_index]] if rightmost_index >= 0 else []
+
+    use_rightmost = best_coeff_leftmost < best_coeff_rightmost
+    if use_rightmost:
+        return best_pair + best_rectangle_rightmost
+    else:
+        return best_rectangle_leftmost + best_pair
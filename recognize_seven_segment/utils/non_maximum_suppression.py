@@ -0,0 +1,65 @@
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+
+def find_response_peaks(response: np.ndarray, match_threshold: float,
+                        neighbourhood_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds local maxima of a matchTemplate response map which are above the threshold.
+
+    :param neighbourhood_size: size of the square window a peak has to dominate
+    :return: (ys, xs) coordinates of the peaks, ordered like np.where
+    """
+    neighbourhood_size = max(1, int(neighbourhood_size))
+    kernel = np.ones((neighbourhood_size, neighbourhood_size), np.uint8)
+    dilated = cv2.dilate(response, kernel)
+
+    peaks = (response >= dilated) & (response > match_threshold)
+    return np.where(peaks)
+
+
+def intersection_over_union(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """
+    :param box: array (x0, y0, x1, y1)
+    :param boxes: array of shape (n, 4) with (x0, y0, x1, y1) rows
+    :return: IoU of box with every row of boxes
+    """
+    x0 = np.maximum(box[0], boxes[:, 0])
+    y0 = np.maximum(box[1], boxes[:, 1])
+    x1 = np.minimum(box[2], boxes[:, 2])
+    y1 = np.minimum(box[3], boxes[:, 3])
+
+    intersection = np.maximum(0, x1 - x0) * np.maximum(0, y1 - y0)
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = box_area + areas - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+
+def suppress_overlapping_rectangles(rectangles: List[Tuple], iou_threshold: float = 0.3) -> List[Tuple]:
+    """
+    Greedy IoU suppression - keeps the most confident rectangle of every group of overlapping ones.
+
+    :param rectangles: list of ((x0, y0, x1, y1), confidence, ...) tuples
+    :return: kept rectangles in their original order
+    """
+    if len(rectangles) < 2:
+        return list(rectangles)
+
+    boxes = np.array([rectangle[0] for rectangle in rectangles], dtype=np.float64)
+    confidences = np.array([rectangle[1] for rectangle in rectangles], dtype=np.float64)
+
+    order = np.argsort(-confidences, kind="stable")
+    kept_indexes = []
+    while len(order):
+        best = order[0]
+        kept_indexes.append(best)
+
+        overlaps = intersection_over_union(boxes[best], boxes[order[1:]])
+        order = order[1:][overlaps <= iou_threshold]
+
+    kept_indexes.sort()
+    return [rectangles[index] for index in kept_indexes]
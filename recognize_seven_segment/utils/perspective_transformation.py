@@ -1,3 +1,5 @@
+from typing import Optional, Tuple
+
 import cv2
 import numpy as np
 
@@ -16,7 +18,8 @@ def _rearrange_corners(rectangle_corners: np.ndarray) -> np.ndarray:
     return np.array([top_left, top_right, bottom_right, bottom_left], dtype="float32")
 
 
-def perspective_transformation(image: np.ndarray, rectangle_corners: np.ndarray) -> np.ndarray:
+def perspective_transformation(image: np.ndarray, rectangle_corners: np.ndarray,
+                               output_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
     """
     :param image: np.array ( rows, cols, channels ), integer values 0 - 255
     :param rectangle_corners: np.array of 4 pts, inteter, e.g.
@@ -24,19 +27,23 @@ def perspective_transformation(image: np.ndarray, rectangle_corners: np.ndarray)
          [ 29 541]
          [251 546]
          [258 341]]
+    :param output_size: (width, height) of the result, by default the measured size of the rectangle is used
     :return:
     """
     rearranged_corners = _rearrange_corners(rectangle_corners)
     top_left, top_right, bottom_right, bottom_left = rearranged_corners
 
-    width_top = np.linalg.norm(bottom_right - bottom_left)
-    width_bottom = np.linalg.norm(top_right - top_left)
+    if output_size is None:
+        width_top = np.linalg.norm(bottom_right - bottom_left)
+        width_bottom = np.linalg.norm(top_right - top_left)
 
-    height_right = np.linalg.norm(top_right - bottom_right)
-    height_left = np.linalg.norm(top_left - bottom_left)
+        height_right = np.linalg.norm(top_right - bottom_right)
+        height_left = np.linalg.norm(top_left - bottom_left)
 
-    width = int(max(width_top, width_bottom))
-    height = int(max(height_right, height_left))
+        width = int(max(width_top, width_bottom))
+        height = int(max(height_right, height_left))
+    else:
+        width, height = output_size
 
     dst = np.array([[0, 0],
                     [width, 0],
@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 
 
@@ -18,3 +19,21 @@ import numpy as np
 
 def preprocess(image: np.ndarray) -> np.ndarray:
     return image
+
+
+CHANNEL_GRAY = "gray"
+CHANNEL_VALUE = "value"  # V of HSV, i.e. the maximum of B, G and R
+
+
+def extract_channel(image: np.ndarray, channel: str) -> np.ndarray:
+    """
+    :param image: Image of shape (height, width, 3), BGR
+    :return: Image of shape (height, width)
+    """
+    if channel == CHANNEL_GRAY:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    if channel == CHANNEL_VALUE:
+        return cv2.max(cv2.max(image[:, :, 0], image[:, :, 1]), image[:, :, 2])
+
+    raise AssertionError(f"Unknown channel: {channel}")
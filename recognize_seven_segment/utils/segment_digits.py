@@ -0,0 +1,106 @@
+from typing import Callable, Hashable, List, Tuple
+
+import cv2
+import numpy as np
+
+MIN_SEGMENT_AREA_RATIO = 0.0005  # components smaller than this part of the display are noise (or decimal points)
+MIN_DIGIT_HEIGHT_RATIO = 0.6  # blobs lower than this part of the highest blob are not digits
+MAX_DIGIT_WIDTH_RATIO = 0.5  # blobs wider than this part of the display are borders or shadows
+MAX_DIGIT_HEIGHT_RATIO = 0.9  # components higher than this part of the display are borders or shadows
+WINDOW_MARGIN = 4  # covers rounding of the template width (e.g. by the template bank)
+
+
+def find_digit_blobs(display: np.ndarray) -> List[List[int]]:
+    """
+    Segments a thresholded display (dark glyphs on light background) into digit candidates.
+
+    Segments of a seven segment digit are usually not connected, so components overlapping
+    in the horizontal direction are merged into a single blob. Components touching the display border
+    (e.g. the dark frame left by the perspective warp) or too large to be a digit are dropped first,
+    otherwise they would swallow all the digits they overlap.
+
+    :return: list of blob bounding boxes (x0, y0, x1, y1) ordered from left to right
+    """
+    display_height, display_width = display.shape
+    foreground = (display < 128).astype(np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(foreground)
+
+    min_area = MIN_SEGMENT_AREA_RATIO * display_height * display_width
+    boxes = sorted([x, y, x + width, y + height] for x, y, width, height, area in stats[1:]
+                   if area >= min_area and not _is_border_component(x, y, width, height, display_width, display_height))
+
+    blobs = []
+    for box in boxes:
+        if len(blobs) > 0 and box[0] < blobs[-1][2]:
+            blob = blobs[-1]
+            blob[1], blob[2], blob[3] = min(blob[1], box[1]), max(blob[2], box[2]), max(blob[3], box[3])
+        else:
+            blobs.append(box)
+
+    blobs = [blob for blob in blobs if blob[2] - blob[0] <= MAX_DIGIT_WIDTH_RATIO * display_width]
+    if len(blobs) == 0:
+        return []
+
+    max_height = max(y1 - y0 for _, y0, _, y1 in blobs)
+    return [blob for blob in blobs if blob[3] - blob[1] >= MIN_DIGIT_HEIGHT_RATIO * max_height]
+
+
+def _is_border_component(x, y, width, height, display_width, display_height) -> bool:
+    if x == 0 or y == 0 or x + width == display_width or y + height == display_height:
+        return True
+
+    return width > MAX_DIGIT_WIDTH_RATIO * display_width or height > MAX_DIGIT_HEIGHT_RATIO * display_height
+
+
+def get_ink_height_ratio(template: np.ndarray) -> float:
+    """
+    :return: height of the glyph (dark pixels) in a template divided by the template width
+    """
+    rows = np.where((template < 128).any(axis=1))[0]
+    if len(rows) == 0:
+        return template.shape[0] / float(template.shape[1])
+
+    return (rows[-1] - rows[0] + 1) / float(template.shape[1])
+
+
+def classify_blobs(display: np.ndarray, blobs: List[List[int]],
+                   get_template: Callable[[Hashable, int], np.ndarray],
+                   glyph_names: List[Hashable], ink_height_ratios: List[float],
+                   match_threshold: float = 0.7) -> List[Tuple[List[int], float, Hashable]]:
+    """
+    Matches every glyph once per blob - the template is sized so that its glyph is as high as the blob
+    and it is matched only in a small window around the blob.
+
+    :param get_template: function (glyph, width) -> template, e.g. TemplateBank.get
+    :param ink_height_ratios: get_ink_height_ratio of every glyph
+    :return: list of the best glyph occurence of every blob ((x0, y0, x1, y1), confidence, glyph),
+        blobs without a glyph matching above the threshold are left out
+    """
+    display_height, display_width = display.shape
+
+    rectangles = []
+    for x0, y0, x1, y1 in blobs:
+        best_rectangle = None
+        for glyph, ink_height_ratio in zip(glyph_names, ink_height_ratios):
+            template = get_template(glyph, int(round((y1 - y0) / ink_height_ratio)))
+            template_height, template_width = template.shape
+
+            # window where the template covers the whole blob, clipped to the display
+            window_x0 = max(0, x1 - template_width - WINDOW_MARGIN)
+            window_y0 = max(0, y1 - template_height - WINDOW_MARGIN)
+            window_x1 = min(display_width, x0 + template_width + WINDOW_MARGIN)
+            window_y1 = min(display_height, y0 + template_height + WINDOW_MARGIN)
+            if window_x1 - window_x0 < template_width or window_y1 - window_y0 < template_height:
+                continue
+
+            window = display[window_y0:window_y1, window_x0:window_x1]
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (x, y) = cv2.minMaxLoc(result)
+            if confidence > match_threshold and (best_rectangle is None or confidence > best_rectangle[1]):
+                x, y = x + window_x0, y + window_y0
+                best_rectangle = ([x, y, x + template_width, y + template_height], confidence, glyph)
+
+        if best_rectangle is not None:
+            rectangles.append(best_rectangle)
+
+    return rectangles
@@ -0,0 +1,56 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class StageTimer(object):
+    """
+    Records durations of the named stages of a pipeline call and aggregates them over all calls.
+
+    Usage:
+        timer.start_call()
+        with timer.stage("preprocessing"):
+            ...
+        timer.durations  # {"preprocessing": seconds} of the last call
+    """
+
+    def __init__(self, callback: Optional[Callable[[str, float], None]] = None):
+        """
+        :param callback: function (stage, duration in seconds) called after every recorded stage
+        """
+        self._callback = callback
+        self._totals = defaultdict(float)
+        self._counts = Counter()
+        self.durations: Dict[str, float] = {}  # stages of the last call
+
+    def start_call(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, duration: float):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self._totals[name] += duration
+        self._counts[name] += 1
+
+        if self._callback is not None:
+            self._callback(name, duration)
+
+    def statistics(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: {stage: {"count", "total", "mean"}} over all calls, durations in seconds
+        """
+        return {name: {"count": self._counts[name], "total": total, "mean": total / self._counts[name]}
+                for name, total in self._totals.items()}
+
+    def reset(self):
+        self._totals.clear()
+        self._counts.clear()
+        self.durations = {}
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Tuple
+
+import imutils
+import numpy as np
+
+
+class TemplateBank(object):
+    """
+    LRU cache of glyph templates resized to bucketed widths.
+
+    Requested widths are rounded to a multiple of width_quantum, so displays whose
+    width differs by a few pixels between frames share the same resized templates.
+    Returned templates are read-only, they are shared by all callers.
+    """
+
+    def __init__(self, glyphs: Dict[Hashable, np.ndarray], width_quantum: int = 4, max_size: int = 256):
+        if width_quantum < 1:
+            raise AssertionError("width_quantum has to be positive")
+
+        if max_size < 1:
+            raise AssertionError("max_size has to be positive")
+
+        self._glyphs = glyphs
+        self._width_quantum = width_quantum
+        self._max_size = max_size
+        self._templates: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def glyph_names(self):
+        return list(self._glyphs.keys())
+
+    @property
+    def size(self):
+        return len(self._templates)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+
+        return self.hits / total
+
+    def quantize_width(self, width: int) -> int:
+        buckets = int(round(width / self._width_quantum))
+        return max(1, buckets) * self._width_quantum
+
+    def get(self, glyph: Hashable, width: int = 40) -> np.ndarray:
+        key = (glyph, self.quantize_width(width))
+
+        template = self._templates.get(key)
+        if template is not None:
+            self.hits += 1
+            self._templates.move_to_end(key)
+            return template
+
+        self.misses += 1
+        return self._store(key)
+
+    def warm_up(self, widths: Iterable[int], glyphs: Iterable[Hashable] = None):
+        """
+        Precomputes templates of the given glyphs (all by default) for the buckets of given widths.
+        Warming up does not count into hits/misses.
+        """
+        if glyphs is None:
+            glyphs = self.glyph_names
+
+        glyphs = list(glyphs)
+        for width in widths:
+            for glyph in glyphs:
+                key = (glyph, self.quantize_width(width))
+                if key not in self._templates:
+                    self._store(key)
+
+    def statistics(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "size": self.size}
+
+    def clear(self):
+        self._templates.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, key: Tuple[Hashable, int]) -> np.ndarray:
+        glyph, width = key
+        template = imutils.resize(self._glyphs[glyph], width=width)
+        template.flags.writeable = False
+
+        self._templates[key] = template
+        if len(self._templates) > self._max_size:
+            self._templates.popitem(last=False)
+
+        return template
+
+    def __contains__(self, key: Tuple[Hashable, int]) -> bool:
+        glyph, width = key
+        return (glyph, self.quantize_width(width)) in self._templates
@@ -1,3 +1,6 @@
+import os
+from typing import Optional
+
 import cv2
 import numpy as np
 
@@ -17,3 +20,104 @@ def threshold_colored(image: np.ndarray) -> np.ndarray:
     image = 255 - image
     image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 101, 10)
     return image
+
+
+THRESHOLD_MEAN_SHIFT = "mean_shift"  # pyrMeanShiftFiltering + Otsu, the most robust and by far the slowest
+THRESHOLD_BILATERAL = "bilateral"  # bilateral filter of a downscaled copy + Otsu
+THRESHOLD_GUIDED = "guided"  # self-guided filter (box filters only) + Otsu
+THRESHOLD_ADAPTIVE = "adaptive"  # local mean thresholding, no smoothing
+
+THRESHOLD_STRATEGIES = [THRESHOLD_MEAN_SHIFT, THRESHOLD_BILATERAL, THRESHOLD_GUIDED, THRESHOLD_ADAPTIVE]
+
+
+def parse_threshold_strategy(value: str, single_channel: bool = False) -> str:
+    """
+    :param value: name of one of THRESHOLD_STRATEGIES
+    :param single_channel: the strategy thresholds single channel images (THRESHOLD_MEAN_SHIFT is not allowed)
+    """
+    strategy = value.strip()
+    if strategy not in THRESHOLD_STRATEGIES:
+        raise AssertionError(f"Unknown threshold strategy {strategy}, "
+                             f"known strategies: {', '.join(THRESHOLD_STRATEGIES)}")
+
+    if single_channel and strategy == THRESHOLD_MEAN_SHIFT:
+        raise AssertionError("Mean shift thresholding needs a color image")
+
+    return strategy
+
+
+# strategy of the deployment, e.g. GLUCOSCAN_THRESHOLD_STRATEGY=bilateral, validated at import so a typo fails the start
+DEFAULT_THRESHOLD_STRATEGY = parse_threshold_strategy(os.environ.get("GLUCOSCAN_THRESHOLD_STRATEGY",
+                                                                     THRESHOLD_MEAN_SHIFT))
+# mean shift filtering needs colors, so single channel images have their own default
+DEFAULT_SINGLE_CHANNEL_THRESHOLD_STRATEGY = parse_threshold_strategy(
+    os.environ.get("GLUCOSCAN_SINGLE_CHANNEL_THRESHOLD_STRATEGY", THRESHOLD_BILATERAL), single_channel=True)
+
+BILATERAL_DOWNSCALE_FACTOR = 0.5
+GUIDED_RADIUS_RATIO = 0.02  # filter radius as a part of the shorter display side
+GUIDED_EPSILON = 0.01  # regularization, for intensities in [0, 1]
+ADAPTIVE_BLOCK_RATIO = 0.5  # block as a part of the shorter display side, has to be larger than digit strokes
+ADAPTIVE_OFFSET = 10
+
+
+def threshold_display(image: np.ndarray, strategy: Optional[str] = None) -> np.ndarray:
+    """
+    Binarizes a warped display, the digits are black (0) and the background is white (255).
+
+    :param image: Image of shape (height, width, 3) or a single channel image of shape (height, width)
+    :param strategy: one of THRESHOLD_STRATEGIES (THRESHOLD_MEAN_SHIFT needs a color image),
+        DEFAULT_THRESHOLD_STRATEGY or DEFAULT_SINGLE_CHANNEL_THRESHOLD_STRATEGY by default
+    :return: Image of shape (height, width)
+    """
+    single_channel = image.ndim == 2
+    if strategy is None:
+        strategy = DEFAULT_SINGLE_CHANNEL_THRESHOLD_STRATEGY if single_channel else DEFAULT_THRESHOLD_STRATEGY
+
+    if strategy == THRESHOLD_MEAN_SHIFT:
+        if single_channel:
+            raise AssertionError("Mean shift thresholding needs a color image")
+
+        image = cv2.pyrMeanShiftFiltering(image, 21, 51)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, threshold = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return threshold
+
+    if strategy not in THRESHOLD_STRATEGIES:
+        raise AssertionError(f"Unknown threshold strategy: {strategy}")
+
+    gray = image if single_channel else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if strategy == THRESHOLD_BILATERAL:
+        height, width = gray.shape
+        small = cv2.resize(gray, (max(1, int(width * BILATERAL_DOWNSCALE_FACTOR)),
+                                  max(1, int(height * BILATERAL_DOWNSCALE_FACTOR))), interpolation=cv2.INTER_AREA)
+        small = cv2.bilateralFilter(small, 9, 50, 50)
+        gray = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    elif strategy == THRESHOLD_GUIDED:
+        radius = max(1, int(min(gray.shape) * GUIDED_RADIUS_RATIO))
+        gray = guided_filter(gray, radius, GUIDED_EPSILON)
+    elif strategy == THRESHOLD_ADAPTIVE:
+        block_size = max(3, int(min(gray.shape) * ADAPTIVE_BLOCK_RATIO)) | 1
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                                     block_size, ADAPTIVE_OFFSET)
+
+    _, threshold = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return threshold
+
+
+def guided_filter(image: np.ndarray, radius: int, epsilon: float) -> np.ndarray:
+    """
+    Edge-preserving smoothing of a gray image guided by itself (He et al.), it costs a few box filters.
+
+    :return: smoothed uint8 image
+    """
+    kernel = (2 * radius + 1, 2 * radius + 1)
+    guide = image.astype(np.float32) / 255
+
+    mean = cv2.boxFilter(guide, -1, kernel)
+    variance = cv2.boxFilter(guide * guide, -1, kernel) - mean * mean
+
+    a = variance / (variance + epsilon)
+    b = mean - a * mean
+    smoothed = cv2.boxFilter(a, -1, kernel) * guide + cv2.boxFilter(b, -1, kernel)
+
+    return np.clip(smoothed * 255, 0, 255).astype(np.uint8)